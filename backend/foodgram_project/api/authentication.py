@@ -0,0 +1,83 @@
+import copy
+import hashlib
+import time
+
+from api.metrics import record_cache
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+TOKEN_CACHE_KEY = 'auth:token:{}'
+LOCAL_MAX_ENTRIES = 1000
+
+# Ключ токена -> (срок действия, токен с пользователем) в памяти воркера.
+local_tokens = {}
+
+
+def get_cache_key(key):
+    return TOKEN_CACHE_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def clear_token_cache(keys):
+    keys = list(keys)
+
+    for key in keys:
+        local_tokens.pop(key, None)
+
+    if settings.SHARED_CACHE:
+        cache.delete_many([get_cache_key(key) for key in keys])
+
+
+def copy_token(token):
+    # Каждый запрос получает свои копии, чтобы изменения request.user
+    # не попадали в снимок.
+    token = copy.copy(token)
+    token.user = copy.copy(token.user)
+
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе на каждый запрос.
+
+    Снимок токена с пользователем хранится в памяти воркера
+    TOKEN_CACHE_LOCAL_TIMEOUT секунд и, если кэш общий (SHARED_CACHE),
+    в нем TOKEN_CACHE_TIMEOUT секунд. Сброс - по сигналам в api.signals:
+    выход, смена пароля, деактивация пользователя. Другие воркеры
+    узнают о сбросе не позже чем через TOKEN_CACHE_LOCAL_TIMEOUT.
+    """
+
+    def authenticate_credentials(self, key):
+        now = time.monotonic()
+        entry = local_tokens.get(key)
+
+        if entry is not None and entry[0] > now:
+            record_cache('auth_tokens_local', True)
+            token = copy_token(entry[1])
+            return token.user, token
+
+        record_cache('auth_tokens_local', False)
+
+        if settings.SHARED_CACHE:
+            token = self.get_shared_token(key)
+        else:
+            # Сброс в LocMemCache не дошел бы до других воркеров.
+            _, token = super().authenticate_credentials(key)
+
+        if len(local_tokens) >= LOCAL_MAX_ENTRIES:
+            local_tokens.pop(next(iter(local_tokens)), None)
+        local_tokens[key] = (now + settings.TOKEN_CACHE_LOCAL_TIMEOUT, token)
+
+        token = copy_token(token)
+        return token.user, token
+
+    def get_shared_token(self, key):
+        cache_key = get_cache_key(key)
+        token = cache.get(cache_key)
+        record_cache('auth_tokens', token is not None)
+
+        if token is None:
+            _, token = super().authenticate_credentials(key)
+            cache.set(cache_key, token, settings.TOKEN_CACHE_TIMEOUT)
+
+        return token
@@ -0,0 +1,109 @@
+import gzip
+import hashlib
+import re
+
+from api.metrics import record_cache
+from api.serializers import IngredientSerializer, TagSerializer
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from recipes.catalog import get_catalog_version
+from recipes.models import Ingredient, Tag
+from rest_framework.renderers import JSONRenderer
+
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+class CatalogResponse:
+    """Готовый JSON каталога в памяти процесса.
+
+    Сериализуется и сжимается один раз на версию каталога, см.
+    recipes.catalog.get_catalog_version. ETag считается по содержимому,
+    поэтому совпадает во всех воркерах.
+    """
+
+    def __init__(self, name, serializer_class, queryset):
+        self.name = name
+        self.serializer_class = serializer_class
+        self.queryset = queryset
+        self.snapshot = None
+
+    def load(self, version):
+        content = JSONRenderer().render(self.serializer_class(
+            self.queryset.all(),
+            many=True,
+        ).data)
+        digest = hashlib.sha256(content).hexdigest()[:32]
+
+        self.snapshot = (
+            version,
+            content,
+            gzip.compress(content, mtime=0),
+            digest,
+        )
+
+        return self.snapshot
+
+    def get_snapshot(self):
+        version = get_catalog_version(self.name)
+        snapshot = self.snapshot
+        hit = snapshot is not None and snapshot[0] == version
+        record_cache(f'catalog_{self.name}', hit)
+
+        if not hit:
+            snapshot = self.load(version)
+            # Каталог изменился во время загрузки - перечитать позже.
+            if get_catalog_version(self.name) != version:
+                self.snapshot = None
+
+        return snapshot
+
+    def clear(self):
+        self.snapshot = None
+
+    def get_response(self, request):
+        _, content, compressed, digest = self.get_snapshot()
+        use_gzip = ACCEPTS_GZIP.search(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''),
+        )
+
+        etag = f'"{digest}-gzip"' if use_gzip else f'"{digest}"'
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+
+        not_modified = etag in if_none_match or '*' in if_none_match
+        record_cache(f'etag_{self.name}', not_modified)
+
+        if not_modified:
+            response = HttpResponseNotModified()
+        elif use_gzip:
+            response = HttpResponse(
+                compressed,
+                content_type='application/json',
+            )
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(content, content_type='application/json')
+
+        response['ETag'] = etag
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.CATALOG_CACHE_MAX_AGE,
+            must_revalidate=True,
+        )
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        return response
+
+
+tag_catalog = CatalogResponse(
+    'tags',
+    TagSerializer,
+    Tag.objects.order_by('id'),
+)
+ingredient_catalog = CatalogResponse(
+    'ingredients',
+    IngredientSerializer,
+    Ingredient.objects.order_by('id'),
+)
@@ -1,19 +1,27 @@
 import django_filters
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import (Case, Exists, IntegerField, OuterRef, Q, Value,
+                              When)
 from django_filters.rest_framework import filters
-from recipes.models import Recipe, Tag
-from rest_framework.filters import SearchFilter
-from users.models import User
+from django_filters.widgets import QueryArrayWidget
+from recipes.catalog import get_tag_ids_by_slug
+from recipes.models import (Recipe, RecipesAddedToShoppingCart,
+                            UserFavoriteRecipe, normalize_name)
+from recipes.search import search_recipes
+from rest_framework.filters import BaseFilterBackend
+
+TRIGRAM_MIN_LENGTH = 3
 
 
 class RecipeFilter(django_filters.FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+    tags = filters.Filter(
+        method='filter_tags',
+        widget=QueryArrayWidget,
     )
 
-    author = filters.ModelChoiceFilter(
-        queryset=User.objects.all()
+    author = filters.NumberFilter(
+        field_name='author_id',
     )
 
     is_in_shopping_cart = filters.BooleanFilter(
@@ -23,22 +31,95 @@ class RecipeFilter(django_filters.FilterSet):
         method="filter_is_favorited",
     )
 
+    search = filters.CharFilter(
+        method='filter_search',
+    )
+
     class Meta:
         model = Recipe
         fields = (
             'tags',
         )
 
+    def filter_tags(self, queryset, name, value):
+        tag_ids_by_slug = get_tag_ids_by_slug()
+
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'),
+                tag_id__in=[
+                    tag_ids_by_slug[slug]
+                    for slug in value
+                    if slug in tag_ids_by_slug
+                ],
+            )
+        ))
+
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        return queryset.filter(
-            recipe_cart__user=self.request.user
-        ) if value is True and not self.request.user.is_anonymous else queryset
+        if value is not True or self.request.user.is_anonymous:
+            return queryset
+
+        return queryset.filter(Exists(
+            RecipesAddedToShoppingCart.objects.filter(
+                user=self.request.user,
+                recipe_id=OuterRef('pk'),
+            )
+        ))
 
     def filter_is_favorited(self, queryset, name, value):
-        return queryset.filter(
-            recipe_favorite__user=self.request.user
-        ) if value is True and not self.request.user.is_anonymous else queryset
+        if value is not True or self.request.user.is_anonymous:
+            return queryset
+
+        return queryset.filter(Exists(
+            UserFavoriteRecipe.objects.filter(
+                user=self.request.user,
+                recipe_id=OuterRef('pk'),
+            )
+        ))
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
 
 
-class IngredientFilter(SearchFilter):
+class IngredientFilter(BaseFilterBackend):
+    """Поиск ингредиентов по нормализованному названию.
+
+    Сначала совпадения с начала названия, затем по подстроке, затем
+    (на PostgreSQL с pg_trgm) похожие по триграммам. Короткие запросы
+    ищутся только по началу названия через индекс text_pattern_ops.
+    """
     search_param = 'name'
+
+    def filter_queryset(self, request, queryset, view):
+        query = normalize_name(request.query_params.get(
+            self.search_param,
+            '',
+        ))
+
+        if not query:
+            return queryset.order_by('search_name', 'id')
+
+        rank = Case(
+            When(search_name__startswith=query, then=Value(2)),
+            When(search_name__contains=query, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+        if connection.vendor != 'postgresql':
+            return queryset.filter(search_name__contains=query).annotate(
+                search_rank=rank,
+            ).order_by('-search_rank', 'search_name', 'id')
+
+        if len(query) < TRIGRAM_MIN_LENGTH:
+            return queryset.filter(
+                search_name__startswith=query,
+            ).order_by('search_name', 'id')
+
+        return queryset.filter(
+            Q(search_name__contains=query)
+            | Q(search_name__trigram_similar=query),
+        ).annotate(
+            search_rank=rank,
+            similarity=TrigramSimilarity('search_name', query),
+        ).order_by('-search_rank', '-similarity', 'search_name', 'id')
@@ -0,0 +1,180 @@
+import json
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    """Время фаз одного запроса, попавшего в выборку."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.serialize_db = 0.0
+        self.serializing = False
+        self.render_start = None
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db += elapsed
+            if self.serializing:
+                self.serialize_db += elapsed
+
+
+class TimedSerializerMixin:
+    """Считает время сериализации, вложенные сериализаторы не учитываются."""
+
+    def to_representation(self, instance):
+        timings = current_timings.get()
+        if timings is None or timings.serializing:
+            return super().to_representation(instance)
+
+        timings.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            timings.serializing = False
+            timings.serialize += time.perf_counter() - start
+
+
+class ServerTimingMiddleware:
+    """Заголовок Server-Timing и лог с разбивкой времени запроса.
+
+    Подробно замеряется только доля запросов SERVER_TIMING_SAMPLE_RATE,
+    у остальных считается лишь общее время для лога медленных запросов.
+    У потоковых ответов заголовок уходит раньше тела, поэтому
+    Server-Timing им не ставится, а запросы к базе во время отдачи
+    учитываются в логе, который пишется после последней строки.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.SERVER_TIMING_SAMPLE_RATE
+        self.slow_ms = settings.SERVER_TIMING_SLOW_MS
+
+    def __call__(self, request):
+        start = time.perf_counter()
+
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            response = self.get_response(request)
+            if response.streaming:
+                response.streaming_content = self.stream(
+                    request, response, response.streaming_content, start,
+                    None,
+                )
+                return response
+
+            total = (time.perf_counter() - start) * 1000
+            if total >= self.slow_ms:
+                self.log(request, response, {'total_ms': round(total, 2)})
+            return response
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        try:
+            with connection.execute_wrapper(timings.record_query):
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content, start,
+                timings,
+            )
+            return response
+
+        phases = self.get_phases(timings, start, time.perf_counter())
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={phases["db_ms"]:.2f};desc="{timings.queries} queries"',
+            f'view;dur={phases["view_ms"]:.2f}',
+            f'serialize;dur={phases["serialize_ms"]:.2f}',
+            f'render;dur={phases["render_ms"]:.2f}',
+            f'total;dur={phases["total_ms"]:.2f}',
+        ))
+
+        record = {name: round(value, 2) for name, value in phases.items()}
+        record['db_queries'] = timings.queries
+        self.log(request, response, record)
+
+        return response
+
+    def stream(self, request, response, content, start, timings):
+        """Отдает тело потокового ответа и пишет лог после отдачи."""
+        stream_start = time.perf_counter()
+        try:
+            if timings is None:
+                yield from content
+            else:
+                with connection.execute_wrapper(timings.record_query):
+                    yield from content
+        finally:
+            end = time.perf_counter()
+            if timings is None:
+                total = (end - start) * 1000
+                if total >= self.slow_ms:
+                    self.log(request, response, {'total_ms': round(total, 2)})
+            else:
+                phases = self.get_phases(timings, start, end)
+                phases['stream_ms'] = (end - stream_start) * 1000
+                record = {
+                    name: round(value, 2) for name, value in phases.items()
+                }
+                record['db_queries'] = timings.queries
+                self.log(request, response, record)
+
+    def get_phases(self, timings, start, end):
+        if timings.render_start:
+            render = end - timings.render_start
+        else:
+            render = 0
+        serialize = timings.serialize - timings.serialize_db
+        phases = {
+            'total_ms': (end - start) * 1000,
+            'db_ms': timings.db * 1000,
+            'serialize_ms': serialize * 1000,
+            'render_ms': render * 1000,
+        }
+        phases['view_ms'] = max(
+            phases['total_ms'] - phases['db_ms'] - phases['serialize_ms']
+            - phases['render_ms'],
+            0,
+        )
+        return phases
+
+    def process_template_response(self, request, response):
+        # Вызывается сразу перед render(), то есть после выхода из view.
+        timings = current_timings.get()
+        if timings is not None:
+            timings.render_start = time.perf_counter()
+        return response
+
+    def log(self, request, response, record):
+        match = request.resolver_match
+        record = {
+            'route': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **record,
+        }
+        slow = record['total_ms'] >= self.slow_ms
+        logger.log(
+            logging.WARNING if slow else logging.INFO,
+            json.dumps(record, ensure_ascii=False),
+        )
@@ -0,0 +1,135 @@
+import random
+import statistics
+import time
+
+from api.filters import IngredientFilter
+from api.paginations import MAX_PAGE_SIZE
+from api.views import IngredientViewSet
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import Ingredient, normalize_name
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет поиск ингредиентов в базе на синтетическом каталоге. '
+        'Сгенерированные ингредиенты откатываются после замера.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=500000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Вывести планы запросов (EXPLAIN ANALYZE на PostgreSQL)',
+        )
+
+    def handle(self, *args, **options):
+        base = list(Ingredient.objects.values_list('name', 'measurement_unit'))
+
+        if not base:
+            raise CommandError(
+                'В базе нет ингредиентов, сначала выполните '
+                'import_ingredients_csv'
+            )
+
+        generator = random.Random(options['seed'])
+
+        try:
+            with transaction.atomic():
+                self.generate(base, options['size'], generator)
+                self.benchmark(
+                    [name for name, _ in base],
+                    options['queries'],
+                    generator,
+                    options['explain'],
+                )
+                raise Rollback
+        except Rollback:
+            pass
+
+    def generate(self, base, size, generator):
+        start = time.perf_counter()
+        batch = []
+
+        for number in range(size):
+            name, measurement_unit = generator.choice(base)
+            name = f'{name} {generator.choice(("", "марки", "вид"))} {number}'
+            name = ' '.join(name.split())
+
+            batch.append(Ingredient(
+                name=name,
+                measurement_unit=measurement_unit,
+                search_name=normalize_name(name),
+            ))
+
+            if len(batch) >= BATCH_SIZE:
+                Ingredient.objects.bulk_create(batch)
+                batch = []
+
+        Ingredient.objects.bulk_create(batch)
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Ingredient._meta.db_table}')
+
+        self.stdout.write(
+            f'Сгенерировано {size} ингредиентов за '
+            f'{time.perf_counter() - start:.1f} с, '
+            f'всего {Ingredient.objects.count()}'
+        )
+
+    def get_queryset(self, query):
+        request = Request(APIRequestFactory().get(
+            '/api/ingredients/',
+            {IngredientFilter.search_param: query},
+        ))
+        view = IngredientViewSet(request=request, format_kwarg=None)
+
+        return IngredientFilter().filter_queryset(
+            request,
+            Ingredient.objects.all(),
+            view,
+        )[:MAX_PAGE_SIZE]
+
+    def benchmark(self, names, queries, generator, explain):
+        for length in (1, 2, 4, 8):
+            sample = [
+                name[:length]
+                for name in generator.choices(names, k=queries)
+            ]
+            timings = []
+
+            for query in sample:
+                start = time.perf_counter()
+                list(self.get_queryset(query))
+                timings.append(time.perf_counter() - start)
+
+            timings.sort()
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+            self.stdout.write(self.style.SUCCESS(
+                f'Префикс {length} симв.: '
+                f'p50 {statistics.median(timings) * 1000:.2f} мс, '
+                f'p99 {p99 * 1000:.2f} мс'
+            ))
+
+            if explain:
+                queryset = self.get_queryset(sample[0])
+
+                if connection.vendor == 'postgresql':
+                    self.stdout.write(
+                        queryset.explain(analyze=True, buffers=True)
+                    )
+                else:
+                    self.stdout.write(queryset.explain())
@@ -0,0 +1,76 @@
+import random
+import statistics
+import time
+
+from api.filters import IngredientFilter
+from api.serializers import IngredientSerializer
+from api.views import IngredientViewSet
+from django.core.management.base import BaseCommand, CommandError
+from recipes.catalog import ingredient_index
+from recipes.models import Ingredient
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает автодополнение ингредиентов через индекс в памяти '
+        'и через IngredientFilter с запросом в базу'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+
+        if not names:
+            raise CommandError('В базе нет ингредиентов')
+
+        generator = random.Random(options['seed'])
+        queries = [
+            name[:generator.randint(1, 4)]
+            for name in generator.choices(names, k=options['queries'])
+        ]
+
+        ingredient_index.search('')
+
+        self.report('IngredientFilter', [
+            self.time_call(self.search_database, query) for query in queries
+        ])
+        self.report('ingredient_index', [
+            self.time_call(ingredient_index.search, query)
+            for query in queries
+        ])
+
+    def time_call(self, function, query):
+        start = time.perf_counter()
+        function(query)
+        return time.perf_counter() - start
+
+    def search_database(self, query):
+        request = Request(APIRequestFactory().get(
+            '/api/ingredients/',
+            {IngredientFilter.search_param: query},
+        ))
+        view = IngredientViewSet(request=request, format_kwarg=None)
+
+        return IngredientSerializer(
+            IngredientFilter().filter_queryset(
+                request,
+                Ingredient.objects.all(),
+                view,
+            ),
+            many=True,
+        ).data
+
+    def report(self, name, timings):
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{name}: p50 {statistics.median(timings) * 1000:.3f} мс, '
+            f'p99 {p99 * 1000:.3f} мс, '
+            f'всего {sum(timings) * 1000:.1f} мс'
+        ))
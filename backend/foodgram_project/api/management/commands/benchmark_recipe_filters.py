@@ -0,0 +1,110 @@
+import statistics
+import time
+
+from api.filters import RecipeFilter
+from api.views import RecipeViewSet
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from recipes.models import Recipe, Tag, UserFavoriteRecipe
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import User
+
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет планы и время фильтров списка рецептов. '
+        'Для показательных цифр нужна база с ~1M рецептов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='ID пользователя для is_favorited/is_in_shopping_cart',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Вывести план запроса (EXPLAIN ANALYZE на PostgreSQL)',
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        tags = list(Tag.objects.values_list('slug', flat=True)[:3])
+
+        if not tags:
+            raise CommandError('В базе нет тегов')
+
+        self.stdout.write(
+            f'Рецептов: {Recipe.objects.count()}, пользователь: {user}'
+        )
+
+        for params in (
+            {'tags': tags[:1]},
+            {'tags': tags},
+            {'author': user.id},
+            {'is_favorited': '1'},
+            {'is_in_shopping_cart': '1'},
+            {'tags': tags, 'is_favorited': '1'},
+            {'tags': tags, 'author': user.id, 'is_in_shopping_cart': '1'},
+        ):
+            self.benchmark(user, params, options['repeat'], options['explain'])
+
+    def get_user(self, user_id):
+        if user_id is not None:
+            return User.objects.get(id=user_id)
+
+        favorite = UserFavoriteRecipe.objects.select_related('user').first()
+        if favorite is None:
+            raise CommandError('Укажите --user, в базе нет избранного')
+
+        return favorite.user
+
+    def get_queryset(self, user, params):
+        request = Request(APIRequestFactory().get('/api/recipes/', params))
+        request.user = user
+
+        view = RecipeViewSet(
+            request=request,
+            format_kwarg=None,
+            action='list',
+        )
+
+        return RecipeFilter(
+            request.query_params,
+            queryset=view.get_queryset(),
+            request=request,
+        ).qs
+
+    def benchmark(self, user, params, repeat, explain):
+        page_timings = []
+        count_timings = []
+
+        for _ in range(repeat):
+            queryset = self.get_queryset(user, params)
+
+            start = time.perf_counter()
+            list(queryset[:PAGE_SIZE])
+            page_timings.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            count = queryset.count()
+            count_timings.append(time.perf_counter() - start)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{params}: найдено {count}, '
+            f'страница {statistics.median(page_timings) * 1000:.1f} мс, '
+            f'count {statistics.median(count_timings) * 1000:.1f} мс'
+        ))
+
+        if explain:
+            page = self.get_queryset(user, params)[:PAGE_SIZE]
+
+            if connection.vendor == 'postgresql':
+                self.stdout.write(page.explain(analyze=True, buffers=True))
+            else:
+                self.stdout.write(page.explain())
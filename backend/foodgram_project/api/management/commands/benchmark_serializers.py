@@ -0,0 +1,367 @@
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+from collections import defaultdict
+
+from api.serializers import (IngredientSerializer, SubscribeSerializer,
+                             UsersViewSerializer)
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            RecipesAddedToShoppingCart, Tag)
+from recipes.seriaizers import RecipeInShoppingCartSerializer, RecipeSerializer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import Subscribe, User
+
+SIZES = (10, 100, 1000)
+INGREDIENTS_PER_RECIPE = 8
+RECIPES_PER_AUTHOR = 3
+# Каждый замер не короче 50 мс, иначе мелкие пачки тонут в шуме таймера.
+MIN_SAMPLE_TIME = 0.05
+# Абсолютный порог: ухудшение меньше него не считается регрессией,
+# даже если в процентах оно больше threshold.
+MIN_REGRESSION = {'min_ms': 0.05, 'peak_kb': 16}
+# Сколько раз перемерить пачку, прежде чем признать замедление.
+RECHECKS = 2
+
+
+def set_prefetched(instance, name, objects):
+    """Кладет объекты в кэш prefetch_related, как после запроса."""
+    queryset = getattr(instance, name).all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    instance.__dict__.setdefault('_prefetched_objects_cache', {})[name] = (
+        queryset
+    )
+
+
+def calibrate():
+    """Эталонная нагрузка на чистом Python для поправки на скорость машины."""
+    items = [{'id': number, 'name': str(number)} for number in range(2000)]
+    return sorted(items, key=lambda item: item['name'])
+
+
+def block_queries(execute, sql, params, many, context):
+    raise AssertionError(f'Сериализатор обратился к базе: {sql}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет скорость сериализаторов на объектах в памяти, без '
+        'базы данных, и сравнивает с сохраненным JSON-базисом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=15,
+            help='Сколько замеров сделать для каждой пачки',
+        )
+        parser.add_argument('--save', help='Записать результаты в JSON-файл')
+        parser.add_argument(
+            '--compare',
+            help='Сравнить с результатами из JSON-файла',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help=(
+                'Допустимое ухудшение времени и памяти, доля (0.2 = 20%%); '
+                'разница меньше 0.05 мс и 16 КБ не учитывается'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = User(id=1, username='benchmark')
+
+        cases = {}
+
+        for name, serializer_class, build, context in (
+            ('RecipeSerializer', RecipeSerializer, self.build_recipes, {}),
+            ('UsersViewSerializer', UsersViewSerializer, self.build_users,
+             {}),
+            ('SubscribeSerializer', SubscribeSerializer,
+             self.build_subscriptions, None),
+            ('RecipeInShoppingCartSerializer',
+             RecipeInShoppingCartSerializer, self.build_cart, {}),
+            ('IngredientSerializer', IngredientSerializer,
+             self.build_ingredients, {}),
+        ):
+            for size in SIZES:
+                instances = build(size)
+                serializer_context = {'request': request}
+                if context is None:
+                    serializer_context['recipes_by_author'] = (
+                        self.build_recipes_by_author(instances)
+                    )
+                cases[f'{name}/{size}'] = (
+                    serializer_class,
+                    instances,
+                    serializer_context,
+                )
+
+        def measure(key):
+            return self.benchmark(*cases[key], options['repeat'])
+
+        results = {}
+
+        with connection.execute_wrapper(block_queries):
+            for key in cases:
+                results[key] = measure(key)
+                self.report(key, results[key])
+
+            if options['save']:
+                with open(options['save'], 'w', encoding='utf-8') as file:
+                    json.dump(results, file, ensure_ascii=False, indent=2)
+                self.stdout.write(
+                    f'Результаты сохранены в {options["save"]}'
+                )
+
+            if options['compare']:
+                self.compare(
+                    results,
+                    options['compare'],
+                    options['threshold'],
+                    measure,
+                )
+
+    def benchmark(self, serializer_class, instances, context, repeat):
+        def serialize():
+            return serializer_class(instances, many=True, context=context).data
+
+        serialize()
+
+        tracemalloc.start()
+        serialize()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        loops = self.get_loops(serialize)
+        calibration_loops = self.get_loops(calibrate)
+        timings = []
+        calibrations = []
+        gc.collect()
+        gc.disable()
+        try:
+            # Эталон замеряется вперемешку с сериализатором, чтобы оба
+            # попадали под одни и те же колебания частоты и соседей.
+            for _ in range(repeat):
+                calibrations.append(
+                    self.measure(calibrate, calibration_loops)
+                )
+                timings.append(self.measure(serialize, loops))
+        finally:
+            gc.enable()
+
+        timings.sort()
+        p50 = statistics.median(timings)
+
+        return {
+            'ops_per_sec': 1 / p50,
+            'items_per_sec': len(instances) / p50,
+            'min_ms': timings[0] * 1000,
+            'p50_ms': p50 * 1000,
+            'p99_ms': timings[
+                min(len(timings) - 1, int(len(timings) * 0.99))
+            ] * 1000,
+            'peak_kb': peak / 1024,
+            'calibration_ms': min(calibrations) * 1000,
+        }
+
+    def measure(self, function, loops):
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        return (time.perf_counter() - start) / loops
+
+    def get_loops(self, function):
+        """Подбирает число повторов, чтобы замер был не короче порога."""
+        loops = 1
+
+        while True:
+            start = time.perf_counter()
+            for _ in range(loops):
+                function()
+            if time.perf_counter() - start >= MIN_SAMPLE_TIME:
+                return loops
+            loops *= 2
+
+    def report(self, key, result):
+        self.stdout.write(
+            f'{key}: {result["ops_per_sec"]:.1f} оп/с '
+            f'({result["items_per_sec"]:.0f} объектов/с), '
+            f'p50 {result["p50_ms"]:.3f} мс, p99 {result["p99_ms"]:.3f} мс, '
+            f'пик памяти {result["peak_kb"]:.1f} КБ'
+        )
+
+    def compare(self, results, path, threshold, measure):
+        try:
+            with open(path, encoding='utf-8') as file:
+                baseline = json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать базис: {error}')
+
+        regressions = []
+
+        for key, result in results.items():
+            if key not in baseline:
+                continue
+
+            # Минимум устойчивее к шуму соседних процессов, чем медиана.
+            for metric in ('min_ms', 'peak_kb'):
+                regression = self.get_regression(
+                    baseline[key], result, metric, threshold,
+                )
+
+                # Замедление по времени подтверждается повторными
+                # замерами: случайный всплеск нагрузки не повторяется.
+                for _ in range(RECHECKS if metric == 'min_ms' else 0):
+                    if regression is None:
+                        break
+                    result = measure(key)
+                    regression = self.get_regression(
+                        baseline[key], result, metric, threshold,
+                    )
+
+                if regression is not None:
+                    before, after = regression
+                    regressions.append(
+                        f'{key} {metric}: {before:.3f} -> {after:.3f} '
+                        f'(+{(after / before - 1) * 100:.0f}%)'
+                    )
+
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            raise CommandError(
+                f'Сериализаторы медленнее базиса - {len(regressions)}'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Ухудшений больше {threshold * 100:.0f}% нет'
+        ))
+
+    def get_regression(self, baseline, result, metric, threshold):
+        """Возвращает (базис, замер), если замер хуже порогов, иначе None."""
+        before = baseline[metric]
+        after = result[metric]
+
+        # Время базиса пересчитывается на текущую скорость машины
+        # по эталонной нагрузке, замеренной рядом с ним.
+        if metric == 'min_ms' and baseline.get('calibration_ms'):
+            before *= result['calibration_ms'] / baseline['calibration_ms']
+
+        if (
+            before
+            and after > before * (1 + threshold)
+            and after - before > MIN_REGRESSION[metric]
+        ):
+            return before, after
+
+        return None
+
+    def build_users(self, size):
+        users = []
+
+        for number in range(1, size + 1):
+            user = User(
+                id=number,
+                email=f'user{number}@example.com',
+                username=f'user{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            user.is_subscribed = number % 2 == 0
+            users.append(user)
+
+        return users
+
+    def build_ingredients(self, size):
+        return [
+            Ingredient(
+                id=number,
+                name=f'ингредиент {number}',
+                measurement_unit='г',
+            )
+            for number in range(1, size + 1)
+        ]
+
+    def build_recipes(self, size):
+        authors = self.build_users(max(size // RECIPES_PER_AUTHOR, 1))
+        ingredients = self.build_ingredients(INGREDIENTS_PER_RECIPE * 4)
+        tags = [
+            Tag(id=1, name='Завтрак', color='#E26C2D', slug='breakfast'),
+            Tag(id=2, name='Обед', color='#49B64E', slug='lunch'),
+            Tag(id=3, name='Ужин', color='#8775D2', slug='dinner'),
+        ]
+        recipes = []
+
+        for number in range(1, size + 1):
+            author = authors[number % len(authors)]
+            recipe = Recipe(
+                id=number,
+                author=author,
+                name=f'Рецепт {number}',
+                image=f'recites/images/recipe_{number}.png',
+                text='Описание рецепта',
+                cooking_time=30,
+            )
+            recipe.is_favorited = number % 3 == 0
+            recipe.is_in_shopping_cart = number % 5 == 0
+            recipe.author_is_subscribed = author.is_subscribed
+
+            set_prefetched(recipe, 'tags', tags[:number % len(tags) + 1])
+            set_prefetched(recipe, 'recipeingredient_set', [
+                RecipeIngredient(
+                    id=number * INGREDIENTS_PER_RECIPE + position,
+                    recipe=recipe,
+                    ingredient=ingredients[
+                        (number + position) % len(ingredients)
+                    ],
+                    amount=position + 1,
+                )
+                for position in range(INGREDIENTS_PER_RECIPE)
+            ])
+            recipes.append(recipe)
+
+        return recipes
+
+    def build_subscriptions(self, size):
+        user = User(id=size + 1, username='subscriber')
+        subscriptions = []
+
+        for number, author in enumerate(self.build_users(size), start=1):
+            subscription = Subscribe(id=number, user=user, subscribing=author)
+            subscription.recipes_count = RECIPES_PER_AUTHOR
+            subscriptions.append(subscription)
+
+        return subscriptions
+
+    def build_recipes_by_author(self, subscriptions):
+        recipes_by_author = defaultdict(list)
+
+        for subscription in subscriptions:
+            for number in range(RECIPES_PER_AUTHOR):
+                recipes_by_author[subscription.subscribing_id].append(Recipe(
+                    id=subscription.id * RECIPES_PER_AUTHOR + number,
+                    author_id=subscription.subscribing_id,
+                    name=f'Рецепт {number}',
+                    image=f'recites/images/recipe_{number}.png',
+                    cooking_time=30,
+                ))
+
+        return recipes_by_author
+
+    def build_cart(self, size):
+        user = User(id=1, username='benchmark')
+
+        return [
+            RecipesAddedToShoppingCart(id=recipe.id, user=user, recipe=recipe)
+            for recipe in self.build_recipes(size)
+        ]
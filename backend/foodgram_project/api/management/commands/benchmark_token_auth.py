@@ -0,0 +1,90 @@
+import time
+
+from api.authentication import CachedTokenAuthentication, clear_token_cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает TokenAuthentication и CachedTokenAuthentication: '
+        'запросы к базе и время аутентификации на один запрос'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    username='benchmark_token_auth',
+                    email='benchmark_token_auth@example.com',
+                    password='benchmark-password',
+                )
+                token = Token.objects.create(user=user)
+
+                results = [
+                    self.benchmark(
+                        authentication_class,
+                        token.key,
+                        options['requests'],
+                    )
+                    for authentication_class in (
+                        TokenAuthentication,
+                        CachedTokenAuthentication,
+                    )
+                ]
+                clear_token_cache([token.key])
+                raise Rollback
+        except Rollback:
+            pass
+
+        (before_queries, before_time), (after_queries, after_time) = results
+        self.stdout.write(self.style.SUCCESS(
+            f'Экономия: {before_queries - after_queries:.2f} запроса и '
+            f'{(before_time - after_time) * 1e6:.1f} мкс на запрос, '
+            f'быстрее в {before_time / after_time:.1f} раза'
+        ))
+
+    def benchmark(self, authentication_class, key, count):
+        factory = APIRequestFactory()
+        authentication = authentication_class()
+        queries = QueryCounter()
+        elapsed = 0.0
+
+        with connection.execute_wrapper(queries):
+            for _ in range(count):
+                request = Request(factory.get(
+                    '/api/recipes/',
+                    HTTP_AUTHORIZATION=f'Token {key}',
+                ))
+                start = time.perf_counter()
+                authentication.authenticate(request)
+                elapsed += time.perf_counter() - start
+
+        per_request = queries.count / count
+        self.stdout.write(
+            f'{authentication_class.__name__}: {per_request:.2f} запроса '
+            f'к базе, {elapsed / count * 1e6:.1f} мкс на запрос'
+        )
+
+        return per_request, elapsed / count
@@ -0,0 +1,462 @@
+import base64
+import io
+import re
+import tempfile
+import traceback
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from PIL import Image
+from recipes.catalog import clear_ingredient_index, clear_tag_catalog
+from recipes.models import (Ingredient, Recipe, RecipesAddedToShoppingCart,
+                            Tag, UserFavoriteRecipe)
+from rest_framework.authtoken.models import Token
+from users.models import Subscribe, User
+
+PAGE_SIZES = (1, 6, 30)
+# Сколько id передается в пакетные запросы.
+BATCH_SIZE = 10
+
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+
+SAVEPOINT_SQL = re.compile(
+    r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b',
+    re.IGNORECASE,
+)
+
+Case = namedtuple(
+    'Case',
+    'name method path budget status auth paginated params',
+    defaults=(False, None),
+)
+# Бюджет эндпоинта, у которого на PostgreSQL свой путь (INSERT ... ON
+# CONFLICT ... RETURNING в recipes.toggles), а на других базах - ORM.
+VendorBudget = namedtuple('VendorBudget', 'postgresql other')
+
+# Бюджеты запросов на один ответ. Для списков число запросов не должно
+# зависеть от размера страницы. SAVEPOINT не считаются, GET-запросы
+# меряются после прогревающего запроса (кэши каталога, тегов,
+# фрагментов рецептов, флагов пользователя и токенов).
+CASES = (
+    Case('Теги', 'get', '/api/tags/', 0, 200, False),
+    Case('Тег', 'get', '/api/tags/{tag}/', 1, 200, False),
+    Case('Ингредиенты', 'get', '/api/ingredients/', 0, 200, False),
+    Case(
+        'Поиск ингредиентов', 'get', '/api/ingredients/', 2, 200, False,
+        True, {'name': '{ingredient_prefix}'},
+    ),
+    Case('Ингредиент', 'get', '/api/ingredients/{ingredient}/', 1, 200,
+         False),
+    Case('Рецепты', 'get', '/api/recipes/', 2, 200, False, True),
+    Case('Рецепты', 'get', '/api/recipes/', 2, 200, True, True),
+    Case(
+        'Рецепты по фильтрам', 'get', '/api/recipes/', 2, 200, True, True,
+        {
+            'tags': '{tag_slug}',
+            'is_favorited': '1',
+            'is_in_shopping_cart': '0',
+        },
+    ),
+    Case(
+        'Рецепты автора', 'get', '/api/recipes/', 2, 200, True, True,
+        {'author': '{author}'},
+    ),
+    Case(
+        'Рецепты курсором', 'get', '/api/recipes/', 1, 200, True, True,
+        {'cursor': ''},
+    ),
+    Case('Рецепт', 'get', '/api/recipes/{recipe}/', 3, 200, False),
+    Case('Рецепт', 'get', '/api/recipes/{recipe}/', 3, 200, True),
+    Case(
+        'Список покупок', 'get', '/api/recipes/download_shopping_cart/',
+        1, 200, True,
+    ),
+    Case('Пользователи', 'get', '/api/users/', 2, 200, False, True),
+    Case('Пользователи', 'get', '/api/users/', 2, 200, True, True),
+    Case('Пользователь', 'get', '/api/users/{author}/', 1, 200, True),
+    Case('Текущий пользователь', 'get', '/api/users/me/', 0, 200, True),
+    Case(
+        'Подписки', 'get', '/api/users/subscriptions/', 3, 200, True,
+        True, {'recipes_limit': '3'},
+    ),
+    Case(
+        'Регистрация', 'post', '/api/users/', 3, 201, False, False,
+        {
+            'email': 'query-budget@example.com',
+            'username': 'query_budget',
+            'first_name': 'Query',
+            'last_name': 'Budget',
+            'password': 'query-budget-password',
+        },
+    ),
+    Case(
+        'Вход', 'post', '/api/auth/token/login/', 3, 200, False, False,
+        {'email': '{email}', 'password': '{password}'},
+    ),
+    Case(
+        'Создание рецепта', 'post', '/api/recipes/', 11, 201, True, False,
+        '{recipe_data}',
+    ),
+    Case(
+        'Изменение рецепта', 'patch', '/api/recipes/{own_recipe}/', 20,
+        200, True, False, '{recipe_data}',
+    ),
+    Case(
+        'В избранное', 'post', '/api/recipes/{fresh_recipe}/favorite/',
+        VendorBudget(postgresql=1, other=3), 201, True,
+    ),
+    Case(
+        'Из избранного', 'delete', '/api/recipes/{fresh_recipe}/favorite/',
+        1, 204, True,
+    ),
+    Case(
+        'В корзину', 'post', '/api/recipes/{fresh_recipe}/shopping_cart/',
+        VendorBudget(postgresql=4, other=6), 201, True,
+    ),
+    Case(
+        'Из корзины', 'delete',
+        '/api/recipes/{fresh_recipe}/shopping_cart/', 4, 204, True,
+    ),
+    Case(
+        'Подписка', 'post', '/api/users/{fresh_author}/subscribe/', 5,
+        201, True, False, {'recipes_limit': '3'},
+    ),
+    Case(
+        'Отписка', 'delete', '/api/users/{fresh_author}/subscribe/', 3,
+        204, True,
+    ),
+    Case(
+        'Пакетно в избранное', 'post', '/api/recipes/favorite/', 2, 200,
+        True, False, {'ids': '{fresh_recipes}'},
+    ),
+    Case(
+        'Пакетно из избранного', 'delete', '/api/recipes/favorite/', 2,
+        200, True, False, {'ids': '{fresh_recipes}'},
+    ),
+    Case(
+        'Пакетно в корзину', 'post', '/api/recipes/shopping_cart/', 5,
+        200, True, False, {'ids': '{fresh_recipes}'},
+    ),
+    Case(
+        'Пакетно из корзины', 'delete', '/api/recipes/shopping_cart/', 5,
+        200, True, False, {'ids': '{fresh_recipes}'},
+    ),
+    Case(
+        'Пакетная подписка', 'post', '/api/users/subscribe/', 2, 200, True,
+        False, {'ids': '{fresh_authors}'},
+    ),
+    Case(
+        'Пакетная отписка', 'delete', '/api/users/subscribe/', 2, 200,
+        True, False, {'ids': '{fresh_authors}'},
+    ),
+    Case(
+        'Удаление рецепта', 'delete', '/api/recipes/{own_recipe}/', 12,
+        204, True,
+    ),
+    Case(
+        'Смена пароля', 'post', '/api/users/set_password/', 1, 204, True,
+        False,
+        {'current_password': '{password}', 'new_password': 'changed-pw-1'},
+    ),
+    Case('Выход', 'post', '/api/auth/token/logout/', 2, 204, True),
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет, что число SQL-запросов каждого эндпоинта API не '
+        'превышает бюджет и не растет с размером страницы. Данные '
+        'создаются во временной транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--show-sql',
+            action='store_true',
+            help='Печатать запросы всех эндпоинтов, а не только ошибочных',
+        )
+
+    def handle(self, *args, **options):
+        self.show_sql = options['show_sql']
+        self.failures = 0
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            # Бюджеты - для боевой схемы с общим кэшем. В одном процессе
+            # LocMemCache ведет себя как общий, а данные фикстуры не
+            # попадают в настоящий memcached: откат транзакции их бы
+            # оттуда не убрал.
+            SHARED_CACHE=True,
+            CACHES={
+                alias: {
+                    **options,
+                    'BACKEND': LOCMEM_CACHE,
+                    'LOCATION': f'check-query-budget-{alias}',
+                    'OPTIONS': {},
+                }
+                for alias, options in settings.CACHES.items()
+            },
+        ):
+            try:
+                with transaction.atomic():
+                    self.check_cases(self.create_fixture(options['seed']))
+                    raise Rollback
+            except Rollback:
+                pass
+            finally:
+                clear_tag_catalog()
+                clear_ingredient_index()
+
+        if self.failures:
+            raise CommandError(
+                f'Бюджет запросов превышен у эндпоинтов - {self.failures}'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Все эндпоинты в бюджете'))
+
+    def create_fixture(self, seed):
+        if not Ingredient.objects.exists():
+            Ingredient.objects.bulk_create(
+                Ingredient(
+                    name=f'ингредиент {number}',
+                    measurement_unit='г',
+                    search_name=f'ингредиент {number}',
+                )
+                for number in range(50)
+            )
+
+        call_command(
+            'generate_fake_data',
+            users=40,
+            recipes=120,
+            favorites=800,
+            carts=200,
+            subscriptions=400,
+            images=1,
+            seed=seed,
+            stdout=io.StringIO(),
+        )
+
+        user = User.objects.filter(
+            username__startswith='fake_user_',
+        ).annotate(
+            recipes_total=Count('recipes'),
+        ).order_by('-recipes_total', 'id').first()
+        password = 'query-budget-password'
+        user.set_password(password)
+        user.save()
+
+        ingredient = Ingredient.objects.order_by('id').first()
+        tag = Tag.objects.order_by('id').first()
+
+        fresh_recipes = list(Recipe.objects.exclude(
+            id__in=UserFavoriteRecipe.objects.filter(
+                user=user,
+            ).values('recipe_id'),
+        ).exclude(
+            id__in=RecipesAddedToShoppingCart.objects.filter(
+                user=user,
+            ).values('recipe_id'),
+        ).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        fresh_authors = list(User.objects.exclude(
+            id=user.id,
+        ).exclude(
+            id__in=Subscribe.objects.filter(
+                user=user,
+            ).values('subscribing_id'),
+        ).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+
+        image = io.BytesIO()
+        Image.new('RGB', (8, 8), '#49B64E').save(image, 'PNG')
+
+        return {
+            'user': user,
+            'token': Token.objects.create(user=user).key,
+            'email': user.email,
+            'password': password,
+            'tag': tag.id,
+            'tag_slug': tag.slug,
+            'ingredient': ingredient.id,
+            'ingredient_prefix': ingredient.name[:2],
+            'recipe': Recipe.objects.order_by('id').first().id,
+            'own_recipe': user.recipes.order_by('id').first().id,
+            'author': Subscribe.objects.filter(
+                user=user,
+            ).first().subscribing_id,
+            'fresh_recipe': fresh_recipes[0],
+            'fresh_recipes': fresh_recipes,
+            'fresh_author': fresh_authors[0],
+            'fresh_authors': fresh_authors,
+            'recipe_data': {
+                'name': 'Проверка бюджета запросов',
+                'text': 'Описание',
+                'cooking_time': 10,
+                'image': 'data:image/png;base64,' + base64.b64encode(
+                    image.getvalue(),
+                ).decode(),
+                'tags': list(
+                    Tag.objects.order_by('id').values_list('id', flat=True)
+                ),
+                'ingredients': [
+                    {'id': ingredient_id, 'amount': amount}
+                    for amount, ingredient_id in enumerate(
+                        Ingredient.objects.order_by('id').values_list(
+                            'id',
+                            flat=True,
+                        )[:5],
+                        start=1,
+                    )
+                ],
+            },
+        }
+
+    def fill(self, value, fixture):
+        if isinstance(value, dict):
+            return {key: self.fill(item, fixture) for key, item in (
+                value.items()
+            )}
+
+        if isinstance(value, str) and re.fullmatch(r'\{\w+\}', value):
+            return fixture[value[1:-1]]
+
+        if isinstance(value, str):
+            return value.format(**fixture)
+
+        return value
+
+    def check_cases(self, fixture):
+        anonymous = Client()
+        authenticated = Client(HTTP_AUTHORIZATION=f'Token {fixture["token"]}')
+
+        for case in CASES:
+            client = authenticated if case.auth else anonymous
+            path = self.fill(case.path, fixture)
+            params = self.fill(case.params or {}, fixture)
+
+            if case.paginated:
+                variants = [
+                    {**params, 'limit': page_size} for page_size in PAGE_SIZES
+                ]
+            else:
+                variants = [params]
+
+            results = []
+            for data in variants:
+                if case.method == 'get':
+                    # Прогрев кэшей каталогов и фрагментов рецептов.
+                    self.measure(client, case.method, path, data)
+                results.append(self.measure(client, case.method, path, data))
+
+            self.report(case, path, results)
+
+    def measure(self, client, method, path, data):
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            if not SAVEPOINT_SQL.match(sql):
+                queries.append((sql, self.get_call_site()))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            if method == 'get':
+                response = client.get(path, data)
+            else:
+                response = getattr(client, method)(
+                    path,
+                    data,
+                    content_type='application/json',
+                )
+
+            if response.streaming:
+                b''.join(response.streaming_content)
+
+        return response.status_code, queries
+
+    def get_call_site(self):
+        base_dir = str(settings.BASE_DIR)
+        library_frame = None
+
+        for frame in reversed(traceback.extract_stack()[:-3]):
+            filename = frame.filename
+
+            if filename.endswith(('check_query_budget.py', 'manage.py')):
+                continue
+
+            if filename.startswith(base_dir) and (
+                'site-packages' not in filename
+            ):
+                return (
+                    f'{filename[len(base_dir) + 1:]}:{frame.lineno} '
+                    f'{frame.name}'
+                )
+
+            if library_frame is None and 'django/db/' not in filename:
+                library_frame = frame
+
+        if library_frame is None:
+            return 'django'
+
+        return (
+            f'{library_frame.filename.split("site-packages/")[-1]}:'
+            f'{library_frame.lineno} {library_frame.name}'
+        )
+
+    def get_budget(self, case):
+        if not isinstance(case.budget, VendorBudget):
+            return case.budget
+
+        if connection.vendor == 'postgresql':
+            return case.budget.postgresql
+
+        return case.budget.other
+
+    def report(self, case, path, results):
+        budget = self.get_budget(case)
+        counts = [len(queries) for _, queries in results]
+        statuses = {status for status, _ in results}
+        label = 'авторизован' if case.auth else 'аноним'
+        line = (
+            f'{case.method.upper()} {path} ({case.name}, {label}): '
+            f'запросов {"/".join(map(str, counts))}, бюджет {budget}'
+        )
+
+        failed = (
+            statuses != {case.status}
+            or max(counts) > budget
+            or len(set(counts)) > 1
+        )
+
+        if not failed:
+            self.stdout.write(line)
+            if self.show_sql:
+                self.print_queries(results[-1][1])
+            return
+
+        self.failures += 1
+        self.stdout.write(self.style.ERROR(
+            f'{line}, статус {"/".join(map(str, sorted(statuses)))} '
+            f'(ожидается {case.status})'
+        ))
+        self.print_queries(max(results, key=lambda result: len(result[1]))[1])
+
+    def print_queries(self, queries):
+        by_call_site = Counter(call_site for _, call_site in queries)
+        examples = {}
+        for sql, call_site in queries:
+            examples.setdefault(call_site, sql)
+
+        for call_site, count in by_call_site.most_common():
+            self.stdout.write(f'    {count} x {call_site}')
+            self.stdout.write(f'        {examples[call_site][:300]}')
@@ -0,0 +1,149 @@
+import threading
+from collections import Counter
+
+import requests
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import RecipesAddedToShoppingCart, UserFavoriteRecipe
+from users.models import User
+
+TOGGLES = {
+    'favorite': UserFavoriteRecipe,
+    'shopping_cart': RecipesAddedToShoppingCart,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет избранное и корзину под одновременными нажатиями: '
+        'из параллельных запросов к запущенному серверу ровно один '
+        'добавляет или удаляет запись, остальные получают 400, без '
+        'дублей и ошибок 500. Пользователь берется из generate_fake_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--password', default='foodgram-password')
+        parser.add_argument('--timeout', type=float, default=10)
+
+    def handle(self, *args, **options):
+        self.url = options['url'].rstrip('/')
+        self.timeout = options['timeout']
+        self.concurrency = options['concurrency']
+
+        user = User.objects.filter(
+            username__startswith='fake_user_',
+        ).order_by('id').first()
+        if user is None:
+            raise CommandError('Сначала выполните generate_fake_data')
+
+        try:
+            response = requests.post(
+                f'{self.url}/api/auth/token/login/',
+                json={'email': user.email, 'password': options['password']},
+                timeout=self.timeout,
+            )
+            recipes = requests.get(
+                f'{self.url}/api/recipes/',
+                params={'limit': options['rounds']},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as error:
+            raise CommandError(f'Сервер недоступен: {error}')
+
+        if response.status_code != 200:
+            raise CommandError(f'Не удалось войти как {user.email}')
+
+        self.headers = {
+            'Authorization': f'Token {response.json()["auth_token"]}',
+        }
+        recipe_ids = [recipe['id'] for recipe in recipes.json()['results']]
+
+        errors = 0
+        for toggle, model in TOGGLES.items():
+            for recipe_id in recipe_ids:
+                path = f'/api/recipes/{recipe_id}/{toggle}/'
+                # Исходное состояние: записи нет.
+                self.send('delete', path)
+
+                errors += self.check_round(
+                    model, user, recipe_id, 'post', path, 201, 1,
+                )
+                errors += self.check_round(
+                    model, user, recipe_id, 'delete', path, 204, 0,
+                )
+
+        try:
+            call_command(
+                'rebuild_shopping_lists',
+                '--check',
+                '--user', str(user.id),
+                stdout=self.stdout,
+            )
+        except CommandError as error:
+            errors += 1
+            self.stdout.write(self.style.ERROR(str(error)))
+
+        if errors:
+            raise CommandError(f'Найдено ошибок - {errors}')
+
+        self.stdout.write(self.style.SUCCESS(
+            'Одновременные запросы обработаны без дублей и ошибок'
+        ))
+
+    def send(self, method, path):
+        return requests.request(
+            method,
+            f'{self.url}{path}',
+            headers=self.headers,
+            timeout=self.timeout,
+        ).status_code
+
+    def check_round(self, model, user, recipe_id, method, path,
+                    success_status, expected_rows):
+        concurrency = self.concurrency
+        barrier = threading.Barrier(concurrency)
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def worker():
+            # Все потоки отправляют запрос одновременно.
+            barrier.wait()
+            try:
+                status = self.send(method, path)
+            except requests.RequestException as error:
+                status = type(error).__name__
+
+            with lock:
+                statuses[status] += 1
+
+        workers = [
+            threading.Thread(target=worker) for _ in range(concurrency)
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        rows = model.objects.filter(user=user, recipe_id=recipe_id).count()
+        expected = Counter({success_status: 1, 400: concurrency - 1})
+        statuses_text = ', '.join(
+            f'{status}: {count}' for status, count in sorted(
+                statuses.items(),
+                key=lambda item: str(item[0]),
+            )
+        )
+        self.stdout.write(
+            f'{method.upper()} {path}: {statuses_text}, записей {rows}'
+        )
+
+        if statuses != expected or rows != expected_rows:
+            self.stdout.write(self.style.ERROR(
+                f'Ожидалось {success_status}: 1, 400: {concurrency - 1}, '
+                f'записей {expected_rows}'
+            ))
+            return 1
+
+        return 0
@@ -0,0 +1,404 @@
+import json
+import math
+import random
+import statistics
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+# Доли сценариев в общем потоке запросов.
+TRAFFIC_MIX = {
+    'recipes_by_tag': 40,
+    'ingredient_autocomplete': 20,
+    'favorite_toggle': 12,
+    'cart_toggle': 8,
+    'subscriptions': 12,
+    'download_shopping_cart': 8,
+}
+
+EXPECTED_STATUSES = {
+    'recipes_by_tag': {200},
+    'ingredient_autocomplete': {200},
+    'favorite_add': {201, 400},
+    'favorite_remove': {204, 400},
+    'cart_add': {201, 400},
+    'cart_remove': {204, 400},
+    'subscriptions': {200},
+    'download_shopping_cart': {200},
+}
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, name, latency, error):
+        with self.lock:
+            self.latencies[name].append(latency)
+            if error:
+                self.errors[name] += 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест API: воспроизводит типичную смесь запросов '
+        'в несколько потоков и сохраняет результаты в JSON. Пользователи '
+        'берутся из generate_fake_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=30,
+            help='Длительность в секундах',
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=20,
+            help='Сколько пользователей авторизовать',
+        )
+        parser.add_argument('--password', default='foodgram-password')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--timeout', type=float, default=10)
+        parser.add_argument('--output', help='Записать результаты в JSON')
+        parser.add_argument(
+            '--compare',
+            help='Сравнить с результатами из JSON-файла',
+        )
+
+    def handle(self, *args, **options):
+        self.url = options['url'].rstrip('/')
+        self.timeout = options['timeout']
+
+        session = requests.Session()
+        self.prepare(session, options['users'], options['password'])
+
+        stats = Stats()
+        deadline = time.perf_counter() + options['duration']
+        workers = [
+            threading.Thread(
+                target=self.run_worker,
+                args=(
+                    random.Random(options['seed'] + number),
+                    deadline,
+                    stats,
+                ),
+            )
+            for number in range(options['concurrency'])
+        ]
+
+        self.stdout.write(
+            f'{options["concurrency"]} потоков, {options["duration"]} с, '
+            f'{self.url}'
+        )
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        results = {
+            'url': self.url,
+            'revision': self.get_revision(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'concurrency': options['concurrency'],
+            'duration': elapsed,
+            'endpoints': self.summarize(stats, elapsed),
+        }
+        self.report(results)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+        if options['compare']:
+            self.compare(results, options['compare'])
+
+    def get_json(self, session, path, **kwargs):
+        response = session.get(
+            f'{self.url}{path}',
+            timeout=self.timeout,
+            **kwargs,
+        )
+        if response.status_code != 200:
+            raise CommandError(
+                f'GET {path} вернул {response.status_code}'
+            )
+
+        return response.json()
+
+    def prepare(self, session, users_count, password):
+        try:
+            self.tag_slugs = [
+                tag['slug'] for tag in self.get_json(session, '/api/tags/')
+            ]
+            self.ingredient_names = [
+                ingredient['name']
+                for ingredient in self.get_json(session, '/api/ingredients/')
+            ]
+            recipes = self.get_json(
+                session,
+                '/api/recipes/',
+                params={'limit': 100},
+            )
+            users = self.get_json(
+                session,
+                '/api/users/',
+                params={'limit': 100},
+            )['results']
+        except requests.RequestException as error:
+            raise CommandError(f'Сервер недоступен: {error}')
+
+        self.recipe_pages = max(math.ceil(recipes['count'] / 6), 1)
+        self.recipe_ids = [recipe['id'] for recipe in recipes['results']]
+
+        if not (self.tag_slugs and self.ingredient_names and self.recipe_ids):
+            raise CommandError(
+                'Нужны теги, ингредиенты и рецепты, сначала выполните '
+                'generate_fake_data'
+            )
+
+        self.tokens = []
+        for user in users:
+            if len(self.tokens) >= users_count:
+                break
+            if not user['username'].startswith('fake_user_'):
+                continue
+
+            response = session.post(
+                f'{self.url}/api/auth/token/login/',
+                json={'email': user['email'], 'password': password},
+                timeout=self.timeout,
+            )
+            if response.status_code == 200:
+                self.tokens.append(response.json()['auth_token'])
+
+        if not self.tokens:
+            raise CommandError(
+                'Не удалось войти ни одним пользователем generate_fake_data'
+            )
+
+        self.subscription_pages = {}
+        for token in self.tokens:
+            subscriptions = self.get_json(
+                session,
+                '/api/users/subscriptions/',
+                params={'limit': 6},
+                headers={'Authorization': f'Token {token}'},
+            )
+            self.subscription_pages[token] = max(
+                math.ceil(subscriptions['count'] / 6),
+                1,
+            )
+
+    def run_worker(self, generator, deadline, stats):
+        session = requests.Session()
+        scenarios = list(TRAFFIC_MIX)
+        weights = list(TRAFFIC_MIX.values())
+
+        while time.perf_counter() < deadline:
+            scenario = generator.choices(scenarios, weights)[0]
+            getattr(self, scenario)(session, generator, stats)
+
+    def request(self, session, stats, name, method, path, token=None,
+                **kwargs):
+        headers = {}
+        if token is not None:
+            headers['Authorization'] = f'Token {token}'
+
+        start = time.perf_counter()
+        try:
+            response = session.request(
+                method,
+                f'{self.url}{path}',
+                headers=headers,
+                timeout=self.timeout,
+                **kwargs,
+            )
+            response.content
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+
+        stats.add(
+            name,
+            time.perf_counter() - start,
+            status not in EXPECTED_STATUSES[name],
+        )
+
+        return status
+
+    def recipes_by_tag(self, session, generator, stats):
+        self.request(
+            session,
+            stats,
+            'recipes_by_tag',
+            'GET',
+            '/api/recipes/',
+            params={
+                'tags': generator.sample(
+                    self.tag_slugs,
+                    generator.randint(1, min(2, len(self.tag_slugs))),
+                ),
+                'page': generator.randint(1, min(self.recipe_pages, 5)),
+                'limit': 6,
+            },
+        )
+
+    def ingredient_autocomplete(self, session, generator, stats):
+        name = generator.choice(self.ingredient_names)
+
+        for length in range(1, min(len(name), 4) + 1):
+            self.request(
+                session,
+                stats,
+                'ingredient_autocomplete',
+                'GET',
+                '/api/ingredients/',
+                params={'name': name[:length]},
+            )
+
+    def toggle(self, session, generator, stats, name, path):
+        token = generator.choice(self.tokens)
+        path = path.format(generator.choice(self.recipe_ids))
+
+        self.request(session, stats, f'{name}_add', 'POST', path, token)
+        self.request(session, stats, f'{name}_remove', 'DELETE', path, token)
+
+    def favorite_toggle(self, session, generator, stats):
+        self.toggle(
+            session,
+            generator,
+            stats,
+            'favorite',
+            '/api/recipes/{}/favorite/',
+        )
+
+    def cart_toggle(self, session, generator, stats):
+        self.toggle(
+            session,
+            generator,
+            stats,
+            'cart',
+            '/api/recipes/{}/shopping_cart/',
+        )
+
+    def subscriptions(self, session, generator, stats):
+        token = generator.choice(self.tokens)
+
+        self.request(
+            session,
+            stats,
+            'subscriptions',
+            'GET',
+            '/api/users/subscriptions/',
+            token,
+            params={
+                'page': generator.randint(
+                    1,
+                    self.subscription_pages[token],
+                ),
+                'limit': 6,
+                'recipes_limit': 3,
+            },
+        )
+
+    def download_shopping_cart(self, session, generator, stats):
+        self.request(
+            session,
+            stats,
+            'download_shopping_cart',
+            'GET',
+            '/api/recipes/download_shopping_cart/',
+            generator.choice(self.tokens),
+        )
+
+    def get_revision(self):
+        try:
+            return subprocess.run(
+                ('git', 'rev-parse', '--short', 'HEAD'),
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def summarize(self, stats, elapsed):
+        endpoints = {}
+
+        for name, latencies in sorted(stats.latencies.items()):
+            latencies.sort()
+
+            def percentile(share):
+                return latencies[
+                    min(len(latencies) - 1, int(len(latencies) * share))
+                ] * 1000
+
+            endpoints[name] = {
+                'requests': len(latencies),
+                'errors': stats.errors[name],
+                'error_rate': stats.errors[name] / len(latencies),
+                'rps': len(latencies) / elapsed,
+                'p50_ms': statistics.median(latencies) * 1000,
+                'p90_ms': percentile(0.9),
+                'p99_ms': percentile(0.99),
+                'max_ms': latencies[-1] * 1000,
+            }
+
+        return endpoints
+
+    def report(self, results):
+        total = 0
+
+        for name, endpoint in results['endpoints'].items():
+            total += endpoint['requests']
+            self.stdout.write(
+                f'{name}: {endpoint["requests"]} запросов, '
+                f'{endpoint["rps"]:.1f} в с, '
+                f'ошибок {endpoint["error_rate"] * 100:.1f}%, '
+                f'p50 {endpoint["p50_ms"]:.1f} мс, '
+                f'p90 {endpoint["p90_ms"]:.1f} мс, '
+                f'p99 {endpoint["p99_ms"]:.1f} мс'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего {total} запросов, '
+            f'{total / results["duration"]:.1f} в секунду'
+        ))
+
+    def compare(self, results, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                baseline = json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать результаты: {error}')
+
+        self.stdout.write(
+            f'Сравнение с {baseline.get("revision") or path}:'
+        )
+
+        for name, endpoint in results['endpoints'].items():
+            before = baseline['endpoints'].get(name)
+            if before is None:
+                continue
+
+            self.stdout.write(
+                f'{name}: в с {before["rps"]:.1f} -> {endpoint["rps"]:.1f}, '
+                f'p99 {before["p99_ms"]:.1f} -> {endpoint["p99_ms"]:.1f} мс, '
+                f'ошибок {before["error_rate"] * 100:.1f}% -> '
+                f'{endpoint["error_rate"] * 100:.1f}%'
+            )
@@ -0,0 +1,168 @@
+import glob
+import io
+import json
+import os
+import pstats
+import tracemalloc
+
+from api.profiling import prune_captures
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Список, сводка и сравнение профилей запросов из PROFILE_DIR: '
+        'list, show <имя>, diff <было> <стало>, prune'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=('list', 'show', 'diff', 'prune'),
+        )
+        parser.add_argument('names', nargs='*')
+        parser.add_argument('--route', help='Только профили этого маршрута')
+        parser.add_argument(
+            '--sort',
+            default='cumulative',
+            help='Поле сортировки pstats для show',
+        )
+        parser.add_argument('--limit', type=int, default=25)
+        parser.add_argument(
+            '--keep',
+            type=int,
+            default=settings.PROFILE_MAX_CAPTURES,
+            help='Сколько последних профилей оставить при prune',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.PROFILE_MAX_AGE_DAYS,
+            help='Удалить при prune профили старше стольких дней',
+        )
+
+    def handle(self, *args, **options):
+        self.limit = options['limit']
+        names = options['names']
+        action = options['action']
+
+        if action == 'list':
+            self.list_captures(options['route'])
+        elif action == 'prune':
+            removed = prune_captures(options['keep'], options['days'])
+            self.stdout.write(f'Удалено профилей - {removed}')
+        elif action == 'show':
+            if len(names) != 1:
+                raise CommandError('Укажите один профиль')
+            self.show(names[0], options['sort'])
+        else:
+            if len(names) != 2:
+                raise CommandError('Укажите два профиля: было и стало')
+            self.diff(*names)
+
+    def get_path(self, name, extension):
+        path = os.path.join(settings.PROFILE_DIR, f'{name}{extension}')
+        return path if os.path.exists(path) else None
+
+    def require(self, name):
+        if not self.get_path(name, '.json'):
+            raise CommandError(f'Профиль {name} не найден')
+
+    def list_captures(self, route):
+        captures = []
+
+        for path in glob.glob(os.path.join(settings.PROFILE_DIR, '*.json')):
+            with open(path, encoding='utf-8') as file:
+                capture = json.load(file)
+            if route is None or capture['route'] == route:
+                captures.append(capture)
+
+        if not captures:
+            self.stdout.write('Профилей нет')
+            return
+
+        for capture in sorted(captures, key=lambda item: item['created']):
+            self.stdout.write(
+                f'{capture["name"]}: {capture["method"]} {capture["path"]} '
+                f'-> {capture["status"]}, {capture["duration_ms"]:.1f} мс, '
+                f'{", ".join(capture["files"])}'
+            )
+
+    def show(self, name, sort):
+        self.require(name)
+
+        profile = self.get_path(name, '.prof')
+        if profile:
+            output = io.StringIO()
+            pstats.Stats(profile, stream=output).strip_dirs().sort_stats(
+                sort,
+            ).print_stats(self.limit)
+            self.stdout.write(output.getvalue())
+
+        snapshot = self.get_path(name, '.snapshot')
+        if snapshot:
+            self.stdout.write('Память по строкам:')
+            statistics = tracemalloc.Snapshot.load(snapshot).statistics(
+                'lineno',
+            )
+            for statistic in statistics[:self.limit]:
+                self.stdout.write(str(statistic))
+
+    def diff(self, before, after):
+        self.require(before)
+        self.require(after)
+        compared = False
+
+        profiles = (
+            self.get_path(before, '.prof'),
+            self.get_path(after, '.prof'),
+        )
+        if all(profiles):
+            compared = True
+            self.diff_profiles(*profiles)
+
+        snapshots = (
+            self.get_path(before, '.snapshot'),
+            self.get_path(after, '.snapshot'),
+        )
+        if all(snapshots):
+            compared = True
+            self.stdout.write('Разница памяти по строкам:')
+            differences = tracemalloc.Snapshot.load(snapshots[1]).compare_to(
+                tracemalloc.Snapshot.load(snapshots[0]),
+                'lineno',
+            )
+            for difference in differences[:self.limit]:
+                self.stdout.write(str(difference))
+
+        if not compared:
+            raise CommandError('У профилей нет общих данных для сравнения')
+
+    def diff_profiles(self, before, after):
+        before = pstats.Stats(before).stats
+        after = pstats.Stats(after).stats
+        empty = (0, 0, 0.0, 0.0)
+        rows = []
+
+        for function in before.keys() | after.keys():
+            _, calls_before, _, cumulative_before = (
+                before.get(function, empty)[:4]
+            )
+            _, calls_after, _, cumulative_after = (
+                after.get(function, empty)[:4]
+            )
+            rows.append((
+                cumulative_after - cumulative_before,
+                calls_after - calls_before,
+                function,
+            ))
+
+        rows.sort(key=lambda row: abs(row[0]), reverse=True)
+
+        self.stdout.write('Изменение накопленного времени по функциям:')
+        for delta, calls, (filename, line, function) in rows[:self.limit]:
+            self.stdout.write(
+                f'{delta * 1000:+10.3f} мс {calls:+7d} вызовов  '
+                f'{os.path.basename(filename)}:{line}({function})'
+            )
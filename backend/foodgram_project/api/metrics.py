@@ -0,0 +1,109 @@
+import os
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+# Если каталог для метрик задан вне gunicorn, его может еще не быть:
+# без него первая же запись метрики падает с FileNotFoundError.
+if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+REQUESTS = Counter(
+    'foodgram_requests_total',
+    'Запросы по маршрутам',
+    ('route', 'method', 'status'),
+)
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds',
+    'Время обработки запроса',
+    ('route', 'method'),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Histogram(
+    'foodgram_request_db_queries',
+    'Число SQL-запросов на один запрос',
+    ('route', 'method'),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55),
+)
+RESPONSE_SIZE = Histogram(
+    'foodgram_response_size_bytes',
+    'Размер тела ответа',
+    ('route', 'method'),
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576),
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total',
+    'Обращения к кэшам приложения',
+    ('cache', 'result'),
+)
+
+
+def record_cache(name, hit, amount=1):
+    CACHE_REQUESTS.labels(name, 'hit' if hit else 'miss').inc(amount)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Счетчики и гистограммы по маршрутам для Prometheus."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        start = time.perf_counter()
+
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+
+        REQUEST_DURATION.labels(route, request.method).observe(duration)
+        REQUESTS.labels(route, request.method, response.status_code).inc()
+        REQUEST_QUERIES.labels(route, request.method).observe(queries.count)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(route, request.method).observe(
+                len(response.content)
+            )
+
+        return response
+
+
+def metrics(request):
+    """Метрики в текстовом формате Prometheus.
+
+    Доступны с адресов METRICS_ALLOWED_IPS и администраторам. Под
+    gunicorn значения всех воркеров собираются из файлов в каталоге
+    PROMETHEUS_MULTIPROC_DIR.
+    """
+    if (
+        request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS
+        and not request.user.is_staff
+    ):
+        raise Http404
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return HttpResponse(
+        generate_latest(registry),
+        content_type=CONTENT_TYPE_LATEST,
+    )
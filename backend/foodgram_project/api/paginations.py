@@ -1,6 +1,105 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+MAX_PAGE_SIZE = 100
 
 
 class LimitPerPageParametr(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class IdCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    ordering = 'id'
+
+    def decode_cursor(self, request):
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+
+        return super().decode_cursor(request)
+
+
+class ReverseIdCursorPagination(IdCursorPagination):
+    ordering = '-id'
+
+
+class LimitPerPageOrCursorPagination(LimitPerPageParametr):
+    """Постраничная пагинация page/limit или курсорная по ?cursor.
+
+    Курсорный режим включается параметром cursor (пустой - первая
+    страница) и не выполняет COUNT(*), поэтому в ответе нет count.
+    Курсор задает свою сортировку, поэтому с параметрами из
+    cursor_conflicting_params он не сочетается - ответ 400.
+    """
+    cursor_pagination_class = IdCursorPagination
+    cursor_conflicting_params = ()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_pagination = None
+
+        if self.cursor_pagination_class.cursor_query_param in (
+            request.query_params
+        ):
+            conflicting = [
+                param for param in self.cursor_conflicting_params
+                if param in request.query_params
+            ]
+            if conflicting:
+                raise ValidationError({
+                    self.cursor_pagination_class.cursor_query_param: (
+                        'Курсорная пагинация не сочетается с параметрами: '
+                        f'{", ".join(conflicting)}. Используйте page/limit.'
+                    ),
+                })
+
+            self.cursor_pagination = self.cursor_pagination_class()
+            return self.cursor_pagination.paginate_queryset(
+                queryset,
+                request,
+                view,
+            )
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(LimitPerPageOrCursorPagination):
+    cursor_pagination_class = ReverseIdCursorPagination
+    # Поиск сортирует по релевантности, курсор - только по -id.
+    cursor_conflicting_params = ('search',)
+
+
+class IngredientPagination(LimitPerPageParametr):
+    """Страницы только по явному page/limit.
+
+    Без них возвращает обычный список, как раньше, но не длиннее
+    MAX_PAGE_SIZE, чтобы поиск по большому каталогу оставался дешевым.
+    """
+    page_size = 20
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.unpaginated = not (
+            self.page_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+        if self.unpaginated:
+            return list(queryset[:self.max_page_size])
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.unpaginated:
+            return Response(data)
+
+        return super().get_paginated_response(data)
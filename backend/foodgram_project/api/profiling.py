@@ -0,0 +1,221 @@
+import cProfile
+import glob
+import json
+import os
+import re
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import count
+
+from django.conf import settings
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+MODES = ('cprofile', 'tracemalloc')
+TRACEMALLOC_FRAMES = 10
+CAPTURE_EXTENSIONS = ('.prof', '.snapshot', '.json')
+
+capture_numbers = count(1)
+
+
+def get_capture_name(route):
+    return '{}-{:%Y%m%d-%H%M%S}-{}-{}'.format(
+        re.sub(r'[^\w.-]+', '_', route),
+        datetime.now(timezone.utc),
+        os.getpid(),
+        next(capture_numbers),
+    )
+
+
+def prune_captures(max_captures, max_age_days):
+    """Удаляет старые профили, возвращает число удаленных.
+
+    Удаляются профили старше max_age_days дней и самые старые сверх
+    max_captures, 0 отключает лимит.
+    """
+    captures = []
+    for path in glob.glob(os.path.join(settings.PROFILE_DIR, '*.json')):
+        try:
+            captures.append((os.path.getmtime(path), path[:-len('.json')]))
+        except FileNotFoundError:
+            # Профиль уже удалил другой воркер.
+            continue
+
+    captures.sort(reverse=True)
+    oldest = time.time() - max_age_days * 24 * 60 * 60
+    removed = 0
+
+    for position, (modified, path) in enumerate(captures):
+        if not (
+            (max_captures and position >= max_captures)
+            or (max_age_days and modified < oldest)
+        ):
+            continue
+
+        # .json удаляется последним: пока он есть, профиль виден в list.
+        for extension in CAPTURE_EXTENSIONS:
+            try:
+                os.remove(f'{path}{extension}')
+            except FileNotFoundError:
+                pass
+        removed += 1
+
+    return removed
+
+
+def is_staff(request):
+    if request.user.is_staff:
+        return True
+
+    drf_request = Request(request)
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(drf_request)
+        except exceptions.AuthenticationFailed:
+            return False
+        if result is not None:
+            return result[0].is_staff
+
+    return False
+
+
+class Capture:
+    """Профиль cProfile и/или снимок tracemalloc одного запроса."""
+
+    def __init__(self, route, modes):
+        self.route = route
+        self.name = get_capture_name(route)
+        self.profiler = cProfile.Profile() if 'cprofile' in modes else None
+        self.trace = 'tracemalloc' in modes and not tracemalloc.is_tracing()
+        self.duration = 0.0
+        self.started = None
+
+    def begin(self):
+        if self.trace:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.resume()
+
+    def resume(self):
+        self.started = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def pause(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.duration += time.perf_counter() - self.started
+
+    def stream(self, content, request, response):
+        """Профилирует выдачу потокового ответа по частям."""
+        iterator = iter(content)
+        try:
+            while True:
+                self.resume()
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.pause()
+                yield chunk
+        finally:
+            self.finish(request, response)
+
+    def finish(self, request, response):
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILE_DIR, self.name)
+        files = []
+
+        if self.profiler is not None:
+            self.profiler.dump_stats(f'{path}.prof')
+            files.append(f'{self.name}.prof')
+
+        if self.trace:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, cProfile.__file__),
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ))
+            tracemalloc.stop()
+            snapshot.dump(f'{path}.snapshot')
+            files.append(f'{self.name}.snapshot')
+
+        with open(f'{path}.json', 'w', encoding='utf-8') as file:
+            json.dump({
+                'name': self.name,
+                'route': self.route,
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'duration_ms': self.duration * 1000,
+                'created': datetime.now(timezone.utc).isoformat(),
+                'files': files,
+            }, file, ensure_ascii=False, indent=2)
+
+        prune_captures(
+            settings.PROFILE_MAX_CAPTURES,
+            settings.PROFILE_MAX_AGE_DAYS,
+        )
+
+
+class ProfilingMiddleware:
+    """Профилирование отдельных запросов.
+
+    Администратор включает его заголовком X-Profile или параметром
+    profile (cprofile, tracemalloc или оба через запятую). Кроме того,
+    маршруты из PROFILE_SAMPLE_EVERY профилируются каждый N-й раз.
+    Результаты пишутся в PROFILE_DIR, см. команду profile_captures.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_every = settings.PROFILE_SAMPLE_EVERY
+        self.sample_counters = defaultdict(int)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        capture = getattr(request, 'profile_capture', None)
+        if capture is None:
+            return response
+
+        capture.pause()
+        if response.streaming:
+            response.streaming_content = capture.stream(
+                response.streaming_content,
+                request,
+                response,
+            )
+        else:
+            capture.finish(request, response)
+        response['X-Profile-Capture'] = capture.name
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route = request.resolver_match.view_name
+        modes = self.get_modes(request, route)
+
+        if modes:
+            request.profile_capture = Capture(route, modes)
+            request.profile_capture.begin()
+
+    def get_modes(self, request, route):
+        requested = (
+            request.META.get('HTTP_X_PROFILE')
+            or request.GET.get('profile')
+        )
+        if requested and is_staff(request):
+            return {
+                mode for mode in requested.split(',') if mode in MODES
+            } or {'cprofile'}
+
+        every = self.sample_every.get(route)
+        if every:
+            self.sample_counters[route] += 1
+            if self.sample_counters[route] % every == 0:
+                return {'cprofile'}
+
+        return None
@@ -0,0 +1,72 @@
+import csv
+import json
+
+from rest_framework import renderers
+
+
+class ShoppingCartTextRenderer(renderers.BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return '\n'.join(
+                f'{key}: {value}' for key, value in data.items()
+            ).encode(self.charset)
+
+        return ''.join(self.stream(data)).encode(self.charset)
+
+    def stream(self, ingredients):
+        for ingredient in ingredients:
+            yield (
+                f'{ingredient["name"]}: '
+                f'{ingredient["amount"]} '
+                f'{ingredient["measurement_unit"]}\n'
+            )
+
+
+class EchoBuffer:
+    def write(self, value):
+        return value
+
+
+class ShoppingCartCSVRenderer(ShoppingCartTextRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(EchoBuffer())
+
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['name'],
+                ingredient['measurement_unit'],
+                ingredient['amount'],
+            ))
+
+
+class ShoppingCartJSONRenderer(ShoppingCartTextRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def stream(self, ingredients):
+        separator = ''
+
+        yield '['
+        for ingredient in ingredients:
+            yield separator + json.dumps({
+                'name': ingredient['name'],
+                'measurement_unit': ingredient['measurement_unit'],
+                'amount': ingredient['amount'],
+            }, ensure_ascii=False)
+            separator = ','
+        yield ']'
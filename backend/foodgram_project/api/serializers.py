@@ -1,9 +1,60 @@
+from collections import defaultdict
+
+from api.instrumentation import TimedSerializerMixin
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from recipes.memberships import contains, get_memberships
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
 from rest_framework import serializers
 from users.models import Subscribe, User
 
 
-class UsersViewSerializer(serializers.ModelSerializer):
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get('recipes_limit')
+
+    if recipes_limit is None:
+        return None
+
+    return int(recipes_limit)
+
+
+def get_recipes_by_author(author_ids, recipes_limit=None):
+    recipes = Recipe.objects.filter(
+        author_id__in=author_ids,
+    ).only(
+        'id',
+        'name',
+        'image',
+        'cooking_time',
+        'author_id',
+    ).order_by('-id')
+
+    if recipes_limit is not None:
+        recipes = recipes.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=F('id').desc(),
+            ),
+        )
+        sql, params = recipes.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) AS ranked_recipes '
+            'WHERE row_number <= %s ORDER BY id DESC',
+            (*params, recipes_limit),
+        )
+
+    recipes_by_author = defaultdict(list)
+
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+
+    return recipes_by_author
+
+
+class UsersViewSerializer(TimedSerializerMixin,
+                          serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField(
         read_only=True,
     )
@@ -20,15 +71,25 @@ class UsersViewSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, user):
-        return (not self.context.get(
-            'request'
-        ).user.is_anonymous and Subscribe.objects.filter(
-            user_id=self.context.get('request').user.id,
-            subscribing__id=user.id,
-        ).exists())
+        if hasattr(user, 'is_subscribed'):
+            return user.is_subscribed
+
+        request = self.context.get('request')
+        if request is None or request.user.is_anonymous:
+            return False
+
+        # Один набор подписок на весь список пользователей.
+        if 'subscriptions' not in self.context:
+            self.context['subscriptions'], = get_memberships(
+                request.user.id,
+                'subscriptions',
+            )
+
+        return contains(self.context['subscriptions'], user.id)
 
 
-class UsersSerializer(serializers.ModelSerializer):
+class UsersSerializer(TimedSerializerMixin,
+                      serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
 
     class Meta:
@@ -67,7 +128,8 @@ class UsersSerializer(serializers.ModelSerializer):
         return output
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin,
+                    serializers.ModelSerializer):
 
     class Meta:
         model = Tag
@@ -79,7 +141,8 @@ class TagSerializer(serializers.ModelSerializer):
         )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin,
+                           serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
@@ -104,7 +167,8 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
+class SubscribeSerializer(TimedSerializerMixin,
+                          serializers.ModelSerializer):
 
     id = serializers.ReadOnlyField(
         source='subscribing.id'
@@ -143,11 +207,8 @@ class SubscribeSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, object):
 
-        if object.user.id != object.subscribing.id:
-            return Subscribe.objects.filter(
-                user=object.user,
-                subscribing=object.subscribing
-            ).exists()
+        if object.user_id != object.subscribing_id:
+            return True
         else:
             raise serializers.ValidationError(
                 'На себя подписаться нельзя',
@@ -155,21 +216,22 @@ class SubscribeSerializer(serializers.ModelSerializer):
 
     def get_recipes_count(self, object):
 
+        if hasattr(object, 'recipes_count'):
+            return object.recipes_count
+
         return Recipe.objects.filter(
-            author_id=object.user.id,
+            author_id=object.subscribing_id,
         ).count()
 
     def get_recipes(self, object):
 
-        recipes_set = Recipe.objects.filter(
-            author_id=object.subscribing.id,
-        )
-
-        get_recipes_limit_str = self.context['request'].query_params.get(
-            'recipes_limit', None)
+        recipes_by_author = self.context.get('recipes_by_author')
 
-        if get_recipes_limit_str is not None:
-            recipes_set = recipes_set[:int(get_recipes_limit_str)]
+        if recipes_by_author is None:
+            recipes_by_author = get_recipes_by_author(
+                (object.subscribing_id,),
+                get_recipes_limit(self.context['request']),
+            )
 
         return [
             {
@@ -178,5 +240,18 @@ class SubscribeSerializer(serializers.ModelSerializer):
                 'image': recipe.image.url if recipe.image else None,
                 'cooking_time': recipe.cooking_time,
             }
-            for recipe in recipes_set
+            for recipe in recipes_by_author.get(object.subscribing_id, ())
         ]
+
+
+class BatchIdsSerializer(serializers.Serializer):
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_IDS,
+    )
+
+    def validate_ids(self, value):
+        # Повторы обрабатываются один раз, порядок сохраняется.
+        return list(dict.fromkeys(value))
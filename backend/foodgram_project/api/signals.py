@@ -0,0 +1,24 @@
+from api.authentication import clear_token_cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: clear_token_cache([instance.key]))
+
+
+@receiver(post_save, sender=User)
+def token_user_changed(sender, instance, created, update_fields, **kwargs):
+    # При входе сохраняется только last_login, снимок можно не сбрасывать.
+    if created or (
+        update_fields is not None and set(update_fields) == {'last_login'}
+    ):
+        return
+
+    transaction.on_commit(lambda: clear_token_cache(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    ))
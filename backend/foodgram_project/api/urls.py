@@ -1,7 +1,9 @@
+from api.metrics import metrics
 from api.views import (AddRecipeToFavoriteViewSet,
-                       AddRecipeToShoppingCartViewSet, IngredientViewSet,
-                       RecipeViewSet, SubscribeViewSet, TagViewSet,
-                       UsersViewSet)
+                       AddRecipeToShoppingCartViewSet, BatchFavoriteViewSet,
+                       BatchShoppingCartViewSet, BatchSubscribeViewSet,
+                       IngredientViewSet, RecipeViewSet, SubscribeViewSet,
+                       TagViewSet, UsersViewSet)
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -17,6 +19,25 @@ router.register(r'recipes', RecipeViewSet, 'recipes')
 router.register(r'users', UsersViewSet, 'users')
 
 urlpatterns = [
+    path('metrics/', metrics, name='metrics'),
+
+    # Пакетные запросы - до роутера, иначе их перехватит recipes/{pk}/.
+    path('users/subscribe/',
+         BatchSubscribeViewSet.as_view(
+             {'post': 'create',
+              'delete': 'delete'
+              })),
+    path('recipes/favorite/',
+         BatchFavoriteViewSet.as_view(
+             {'post': 'create',
+              'delete': 'delete'
+              })),
+    path('recipes/shopping_cart/',
+         BatchShoppingCartViewSet.as_view(
+             {'post': 'create',
+              'delete': 'delete'
+              })),
+
     path('', include(router.urls)),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,21 +1,37 @@
-import os
-from collections import defaultdict
-
+from api.catalog import ingredient_catalog, tag_catalog
 from api.filters import IngredientFilter, RecipeFilter
-from api.paginations import LimitPerPageParametr
+from api.paginations import (IngredientPagination,
+                             LimitPerPageOrCursorPagination, RecipePagination)
 from api.permissions import IsOwnerOrAdministrator
-from api.serializers import (IngredientSerializer, SubscribeSerializer,
-                             TagSerializer, UsersSerializer,
-                             UsersViewSerializer)
+from api.renderers import (ShoppingCartCSVRenderer, ShoppingCartJSONRenderer,
+                           ShoppingCartTextRenderer)
+from api.serializers import (BatchIdsSerializer, IngredientSerializer,
+                             SubscribeSerializer, TagSerializer,
+                             UsersSerializer, UsersViewSerializer,
+                             get_recipes_by_author, get_recipes_limit)
 from django.conf import settings
-from django.db import IntegrityError
-from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from recipes.catalog import ingredient_index
+from recipes.fragments import get_recipe_representations
+from recipes.memberships import (add_membership, add_memberships,
+                                 annotate_is_subscribed, annotate_recipe_flags,
+                                 remove_membership, remove_memberships,
+                                 set_recipe_flags)
 from recipes.models import (Ingredient, Recipe, RecipeIngredient,
-                            RecipesAddedToShoppingCart, Tag,
-                            UserFavoriteRecipe)
+                            RecipesAddedToShoppingCart, ShoppingCartIngredient,
+                            Tag, UserFavoriteRecipe)
 from recipes.seriaizers import (RecipeInShoppingCartSerializer,
                                 RecipeSerializer, UserFavoriteRecipeSerializer)
+from recipes.shopping_list import (add_recipe_to_shopping_list,
+                                   add_recipes_to_shopping_list,
+                                   remove_recipe_from_shopping_list,
+                                   remove_recipes_from_shopping_list)
+from recipes.toggles import (add_many_to_user_list, add_recipe_to_user_list,
+                             get_existing_ids, remove_many_from_user_list,
+                             remove_recipe_from_user_list)
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -26,7 +42,13 @@ from users.models import Subscribe, User
 class UsersViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
-    pagination_class = LimitPerPageParametr
+    pagination_class = LimitPerPageOrCursorPagination
+
+    def get_queryset(self):
+        return annotate_is_subscribed(
+            User.objects.order_by('id'),
+            self.request.user,
+        )
 
     def get_serializer_class(self):
         if self.request.method == "POST":
@@ -41,7 +63,7 @@ class UsersViewSet(viewsets.ModelViewSet):
 
         if user.check_password(request.data.get('current_password')):
             user.set_password(request.data.get('new_password'))
-            user.save()
+            user.save(update_fields=('password',))
             return Response(status=status.HTTP_204_NO_CONTENT)
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
@@ -68,12 +90,29 @@ class UsersViewSet(viewsets.ModelViewSet):
     def my_subscriptions(self, request):
 
         try:
+            subscriptions = self.paginate_queryset(
+                Subscribe.objects.filter(
+                    user=request.user,
+                ).select_related(
+                    'subscribing',
+                ).annotate(
+                    recipes_count=Count('subscribing__recipes'),
+                ).order_by('id')
+            )
+
             serializer = SubscribeSerializer(
-                self.paginate_queryset(
-                    Subscribe.objects.filter(user=request.user,)
-                ),
+                subscriptions,
                 many=True,
-                context={'request': request}
+                context={
+                    'request': request,
+                    'recipes_by_author': get_recipes_by_author(
+                        [
+                            subscription.subscribing_id
+                            for subscription in subscriptions
+                        ],
+                        get_recipes_limit(request),
+                    ),
+                }
             )
 
             return self.get_paginated_response(serializer.data)
@@ -115,6 +154,7 @@ class SubscribeViewSet(viewsets.ModelViewSet):
             user=auth_user,
             subscribing=subscribing,
         )
+        add_membership(auth_user.id, 'subscriptions', subscribing.id)
 
         serializer = SubscribeSerializer(
             subscribe,
@@ -150,6 +190,11 @@ class SubscribeViewSet(viewsets.ModelViewSet):
 
         else:
             subs_object.delete()
+            remove_membership(
+                request.user.id,
+                'subscriptions',
+                int(self.kwargs['id']),
+            )
             return Response(
                 {"Удалено"},
                 status=status.HTTP_204_NO_CONTENT,
@@ -161,78 +206,136 @@ class TagViewSet(viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+
+        return tag_catalog.get_response(request)
+
 
 class IngredientViewSet(viewsets.ModelViewSet):
     http_method_names = ('get')
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (IngredientFilter,)
-    search_fields = ('^name', )
+    pagination_class = IngredientPagination
+
+    def list(self, request, *args, **kwargs):
+        if (
+            not request.query_params
+            and request.accepted_renderer.format == 'json'
+        ):
+            return ingredient_catalog.get_response(request)
+
+        if settings.INGREDIENT_SEARCH_BACKEND == 'database':
+            return super().list(request, *args, **kwargs)
+
+        return Response(ingredient_index.search(
+            request.query_params.get(IngredientFilter.search_param, ''),
+        ))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all().order_by('-id')
     permission_classes = (IsOwnerOrAdministrator,)
     serializer_class = RecipeSerializer
-    pagination_class = LimitPerPageParametr
+    pagination_class = RecipePagination
 
     filterset_class = RecipeFilter
 
-    def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
-
-    @action(detail=False,
-            url_path='download_shopping_cart',
-            methods=['get'],
-            permission_classes=[IsAuthenticated],
-            )
-    def download_shopping_cart(self, request):
-        final_ingredients_pack = defaultdict(int)
-
-        shopping_cart = RecipesAddedToShoppingCart.objects.filter(
-            user=self.request.user
-        )
+    def get_queryset(self):
+        if self.action == 'list':
+            # Остальные поля списка берутся из кэша фрагментов.
+            queryset = Recipe.objects.only(
+                'id',
+                'author',
+                'revision',
+            ).order_by('-id')
+        else:
+            queryset = Recipe.objects.select_related(
+                'author',
+            ).defer(
+                'search_vector',
+            ).prefetch_related(
+                'tags',
+                Prefetch(
+                    'recipeingredient_set',
+                    queryset=RecipeIngredient.objects.select_related(
+                        'ingredient',
+                    ).order_by('id'),
+                ),
+            ).order_by('-id')
 
-        for i in range(0, len(shopping_cart)):
+        return annotate_recipe_flags(queryset, self.request.user)
 
-            recipe_ingredients_object = RecipeIngredient.objects.filter(
-                recipe=shopping_cart[i].recipe_id
-            )
+    def get_instance(self, recipe_id):
+        recipe = self.get_queryset().get(id=recipe_id)
+        set_recipe_flags([recipe], self.request.user)
 
-            for i in range(0, len(recipe_ingredients_object)):
-                ingredient_object = recipe_ingredients_object[i]
+        return recipe
 
-                final_ingredients_pack[
-                    ingredient_object.ingredient_id
-                ] += ingredient_object.amount
-
-        path = settings.SHOPPING_CART_PATH
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset()),
+        )
+        set_recipe_flags(page, request.user)
 
-        if not os.path.exists(path):
-            os.mkdir(path)
+        return self.get_paginated_response(
+            get_recipe_representations(page, request),
+        )
 
-        file_path = f'{settings.SHOPPING_CART_PATH}/data.txt'
+    def retrieve(self, request, *args, **kwargs):
+        recipe = self.get_object()
+        set_recipe_flags([recipe], request.user)
 
-        with open(file_path, 'w') as file:
-            for ingr_id, ingr_amount in final_ingredients_pack.items():
+        return Response(self.get_serializer(recipe).data)
 
-                ingr_obj = Ingredient.objects.filter(
-                    pk=ingr_id
-                )
+    def perform_create(self, serializer):
+        serializer.save(author=self.request.user)
+        serializer.instance = self.get_instance(serializer.instance.id)
 
-                ingr_m_unit = ingr_obj[0].measurement_unit
+    def perform_update(self, serializer):
+        serializer.save()
+        serializer.instance = self.get_instance(serializer.instance.id)
 
-                file.write(
-                    f'{ingr_obj[0].name}: {ingr_amount} {ingr_m_unit}\n'
-                )
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        remove_recipe_from_shopping_list(instance.id)
+        instance.delete()
 
-        with open(file_path, 'r') as file:
-            response = HttpResponse(file, content_type='text/plain')
-            response['Content-Disposition'] = (
-                f'attachment; filename={os.path.basename(file_path)}'
+    @action(detail=False,
+            url_path='download_shopping_cart',
+            methods=['get'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[
+                ShoppingCartTextRenderer,
+                ShoppingCartCSVRenderer,
+                ShoppingCartJSONRenderer,
+            ],
             )
+    def download_shopping_cart(self, request):
+        renderer = request.accepted_renderer
 
-            return response
+        ingredients = ShoppingCartIngredient.objects.filter(
+            user=request.user,
+        ).values(
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+            amount=F('total_amount'),
+        ).order_by('name', 'measurement_unit')
+
+        response = StreamingHttpResponse(
+            (
+                line.encode(renderer.charset)
+                for line in renderer.stream(ingredients.iterator())
+            ),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename=shopping_list.{renderer.format}'
+        )
+
+        return response
 
 
 class AddRecipeToFavoriteViewSet(viewsets.ModelViewSet):
@@ -242,34 +345,25 @@ class AddRecipeToFavoriteViewSet(viewsets.ModelViewSet):
 
     def create(self, request, **kwargs):
 
-        if not Recipe.objects.filter(
-            id=self.kwargs["id"],
-        ).exists():
+        favorite_object, created = add_recipe_to_user_list(
+            UserFavoriteRecipe,
+            request.user.id,
+            self.kwargs["id"],
+        )
+
+        if favorite_object is None:
             return Response(
                 {"Такого ID рецепта в базе нет"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        recipe_object = Recipe.objects.get(
-            id=self.kwargs["id"],
-        )
-
-        favorite_object = UserFavoriteRecipe.objects.filter(
-            user=request.user,
-            recipe=recipe_object,
-        )
-
-        if favorite_object.exists():
+        if not created:
             return Response(
                 {"detail": "Уже уже в избранном"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        else:
 
-            favorite_object = UserFavoriteRecipe.objects.create(
-                user=request.user,
-                recipe=recipe_object,
-            )
+        add_membership(request.user.id, 'favorites', self.kwargs["id"])
 
         serializer = UserFavoriteRecipeSerializer(
             favorite_object,
@@ -282,31 +376,30 @@ class AddRecipeToFavoriteViewSet(viewsets.ModelViewSet):
 
     def delete(self, request, **kwargs):
 
-        recipe_object = Recipe.objects.filter(
-            id=self.kwargs["id"],
-        )
+        if remove_recipe_from_user_list(
+            UserFavoriteRecipe,
+            request.user.id,
+            self.kwargs["id"],
+        ):
+            remove_membership(request.user.id, 'favorites', self.kwargs["id"])
+            return Response(
+                {"detail": "Удалено"},
+                status=status.HTTP_204_NO_CONTENT,
+            )
 
-        if not recipe_object.exists():
+        # Ничего не удалено - выясняем, есть ли такой рецепт.
+        if not Recipe.objects.filter(
+            id=self.kwargs["id"],
+        ).exists():
             return Response(
                 {"Такого ID рецепта в базе нет"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        fav_recipe_object = UserFavoriteRecipe.objects.filter(
-            user_id=request.user.id,
-            recipe_id=self.kwargs["id"]
+        return Response(
+            {"detail": "Ошибка удаления, записи нет"},
+            status=status.HTTP_400_BAD_REQUEST
         )
-        if fav_recipe_object.exists():
-            fav_recipe_object.delete()
-            return Response(
-                {"detail": "Удалено"},
-                status=status.HTTP_204_NO_CONTENT,
-            )
-        else:
-            return Response(
-                {"detail": "Ошибка удаления, записи нет"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
 
 
 class AddRecipeToShoppingCartViewSet(viewsets.ModelViewSet):
@@ -316,33 +409,27 @@ class AddRecipeToShoppingCartViewSet(viewsets.ModelViewSet):
 
     def create(self, request, **kwargs):
 
-        if not Recipe.objects.filter(
-            id=self.kwargs["id"],
-        ).exists():
+        with transaction.atomic():
+            shopping_cart, created = add_recipe_to_user_list(
+                RecipesAddedToShoppingCart,
+                request.user.id,
+                self.kwargs["id"],
+            )
+            if created:
+                add_recipe_to_shopping_list(self.kwargs["id"], request.user.id)
+                add_membership(request.user.id, 'cart', self.kwargs["id"])
+
+        if shopping_cart is None:
             return Response(
                 {"Такого ID рецепта в базе нет"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        recipe_object = Recipe.objects.get(
-            id=self.kwargs["id"],
-        )
-
-        shopping_cart = RecipesAddedToShoppingCart.objects.filter(
-            user=request.user,
-            recipe=recipe_object,
-        )
-
-        if shopping_cart.exists():
+        if not created:
             return Response(
                 {"detail": "Уже уже в корзине"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        else:
-            shopping_cart = RecipesAddedToShoppingCart.objects.create(
-                user=request.user,
-                recipe=recipe_object,
-            )
 
         serializer = RecipeInShoppingCartSerializer(
             shopping_cart,
@@ -356,6 +443,27 @@ class AddRecipeToShoppingCartViewSet(viewsets.ModelViewSet):
 
     def delete(self, request, **kwargs):
 
+        # DELETE блокирует строку корзины, поэтому при одновременных
+        # запросах список покупок уменьшит только тот, кто ее удалил.
+        with transaction.atomic():
+            deleted = remove_recipe_from_user_list(
+                RecipesAddedToShoppingCart,
+                request.user.id,
+                self.kwargs["id"],
+            )
+            if deleted:
+                remove_recipe_from_shopping_list(
+                    self.kwargs["id"],
+                    user_id=request.user.id,
+                )
+                remove_membership(request.user.id, 'cart', self.kwargs["id"])
+
+        if deleted:
+            return Response(
+                {"detail": "Удалено"},
+                status=status.HTTP_204_NO_CONTENT,
+            )
+
         if not Recipe.objects.filter(
             id=self.kwargs["id"],
         ).exists():
@@ -364,19 +472,162 @@ class AddRecipeToShoppingCartViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        recipe_object = RecipesAddedToShoppingCart.objects.filter(
-            user_id=request.user.id,
-            recipe_id=self.kwargs["id"]
+        return Response(
+            {"detail": "Ошибка удаления, записи нет"},
+            status=status.HTTP_400_BAD_REQUEST
         )
 
-        if recipe_object.exists():
-            recipe_object.delete()
-            return Response(
-                {"detail": "Удалено"},
-                status=status.HTTP_204_NO_CONTENT,
+
+class BatchUserListViewSet(viewsets.ViewSet):
+    """Пакетное добавление и удаление записей пользователя: {"ids": [...]}.
+
+    Для каждого id возвращается статус, который вернул бы одиночный
+    запрос. Наследники задают модель, поле со ссылкой на объект, набор
+    в memberships и тексты ошибок.
+    """
+    permission_classes = (IsAuthenticated,)
+    model = None
+    field = None
+    membership = None
+    missing_create_status = status.HTTP_400_BAD_REQUEST
+    missing_detail = None
+    exists_detail = None
+    absent_detail = None
+
+    def get_ids(self, request):
+        serializer = BatchIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return serializer.validated_data['ids']
+
+    def get_rejected_detail(self, request, target_id):
+        """Причина отказа добавить запись или None."""
+        return None
+
+    def items_added(self, user_id, target_ids):
+        pass
+
+    def items_removed(self, user_id, target_ids):
+        pass
+
+    def create(self, request, **kwargs):
+        ids = self.get_ids(request)
+        rejected = {}
+        for target_id in ids:
+            detail = self.get_rejected_detail(request, target_id)
+            if detail is not None:
+                rejected[target_id] = detail
+
+        with transaction.atomic():
+            added = add_many_to_user_list(
+                self.model,
+                self.field,
+                request.user.id,
+                [target_id for target_id in ids if target_id not in rejected],
             )
-        else:
-            return Response(
-                {"detail": "Ошибка удаления, записи нет"},
-                status=status.HTTP_400_BAD_REQUEST
+            self.items_added(request.user.id, added)
+            add_memberships(request.user.id, self.membership, added)
+            # Статусы - по RETURNING вставки, отсюда только 400 и 404.
+            existing = get_existing_ids(self.model, self.field, ids)
+
+        results = []
+        for target_id in ids:
+            if target_id in added:
+                results.append({
+                    "id": target_id,
+                    "status": status.HTTP_201_CREATED,
+                })
+            elif target_id not in existing:
+                results.append({
+                    "id": target_id,
+                    "status": self.missing_create_status,
+                    "detail": self.missing_detail,
+                })
+            else:
+                results.append({
+                    "id": target_id,
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "detail": rejected.get(target_id, self.exists_detail),
+                })
+
+        return Response({"results": results})
+
+    def delete(self, request, **kwargs):
+        ids = self.get_ids(request)
+
+        with transaction.atomic():
+            removed = remove_many_from_user_list(
+                self.model,
+                self.field,
+                request.user.id,
+                ids,
             )
+            self.items_removed(request.user.id, removed)
+            remove_memberships(request.user.id, self.membership, removed)
+            existing = get_existing_ids(self.model, self.field, ids)
+
+        results = []
+        for target_id in ids:
+            if target_id in removed:
+                results.append({
+                    "id": target_id,
+                    "status": status.HTTP_204_NO_CONTENT,
+                })
+            elif target_id not in existing:
+                results.append({
+                    "id": target_id,
+                    "status": status.HTTP_404_NOT_FOUND,
+                    "detail": self.missing_detail,
+                })
+            else:
+                results.append({
+                    "id": target_id,
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "detail": self.absent_detail,
+                })
+
+        return Response({"results": results})
+
+
+class BatchRecipeListViewSet(BatchUserListViewSet):
+    """Пакетно в recipes/{id}/favorite/ или recipes/{id}/shopping_cart/."""
+    field = 'recipe'
+    missing_detail = "Такого ID рецепта в базе нет"
+    absent_detail = "Ошибка удаления, записи нет"
+
+
+class BatchFavoriteViewSet(BatchRecipeListViewSet):
+    model = UserFavoriteRecipe
+    membership = 'favorites'
+    exists_detail = "Уже уже в избранном"
+
+
+class BatchShoppingCartViewSet(BatchRecipeListViewSet):
+    model = RecipesAddedToShoppingCart
+    membership = 'cart'
+    exists_detail = "Уже уже в корзине"
+
+    def items_added(self, user_id, recipe_ids):
+        if recipe_ids:
+            add_recipes_to_shopping_list(recipe_ids, user_id)
+
+    def items_removed(self, user_id, recipe_ids):
+        if recipe_ids:
+            remove_recipes_from_shopping_list(recipe_ids, user_id)
+
+
+class BatchSubscribeViewSet(BatchUserListViewSet):
+    """Пакетная подписка и отписка: {"ids": [id авторов]}."""
+    model = Subscribe
+    field = 'subscribing'
+    membership = 'subscriptions'
+    missing_create_status = status.HTTP_404_NOT_FOUND
+    missing_detail = "Такого ID пользователя в базе нет"
+    exists_detail = "Уже подписан"
+    absent_detail = "Такой подписки нет."
+
+    def get_rejected_detail(self, request, author_id):
+        if author_id == request.user.id:
+            return "На себя подписаться нельзя"
+
+        return None
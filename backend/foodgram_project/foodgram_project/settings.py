@@ -22,6 +22,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
@@ -33,6 +34,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -40,6 +42,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.instrumentation.ServerTimingMiddleware',
+    'api.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram_project.urls'
@@ -73,6 +77,37 @@ DATABASES = {
     }
 }
 
+# В docker-compose - общий для всех процессов memcached:
+# CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache,
+# CACHE_LOCATION=memcached:11211.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+# LocMemCache живет в памяти одного процесса. То, что должно совпадать
+# во всех воркерах (флаги пользователя, фрагменты рецептов, токены),
+# кэшируется только в общем кэше, иначе читается из базы.
+SHARED_CACHE = CACHE_BACKEND not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    # Фрагменты рецептов, см. recipes.fragments. Используется только при
+    # SHARED_CACHE.
+    'recipes': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', 'recipes'),
+        'KEY_PREFIX': 'recipes',
+        'TIMEOUT': int(os.getenv('RECIPE_CACHE_TIMEOUT', 3600)),
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -95,7 +130,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_FILTER_BACKENDS': [
@@ -138,4 +173,65 @@ MAX_TIME: int = 240
 
 AUTH_USER_MODEL = 'users.User'
 
-SHOPPING_CART_PATH = './text_shopping_cart'
+# memory - индекс названий в памяти воркера (каталог до десятков тысяч),
+# database - поиск в базе по search_name (pg_trgm) с пагинацией.
+INGREDIENT_SEARCH_BACKEND = os.getenv('INGREDIENT_SEARCH_BACKEND', 'memory')
+
+# Сколько секунд браузер может не перепроверять ETag тегов и ингредиентов.
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', 0))
+
+# Доля запросов с подробным замером времени (0 - выключено, 1 - все).
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv('SERVER_TIMING_SAMPLE_RATE', 0))
+# Запросы дольше порога (мс) пишутся в лог с уровнем WARNING.
+SERVER_TIMING_SLOW_MS = float(os.getenv('SERVER_TIMING_SLOW_MS', 1000))
+
+# Адреса, с которых /api/metrics/ отдается без авторизации администратора.
+METRICS_ALLOWED_IPS = os.getenv(
+    'METRICS_ALLOWED_IPS',
+    '127.0.0.1,::1',
+).split(',')
+
+# Каталог для профилей запросов, см. api.profiling.
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+# Лимиты каталога профилей: при каждой записи удаляются профили старше
+# PROFILE_MAX_AGE_DAYS дней и самые старые сверх PROFILE_MAX_CAPTURES.
+# 0 отключает лимит.
+PROFILE_MAX_CAPTURES = int(os.getenv('PROFILE_MAX_CAPTURES', 200))
+PROFILE_MAX_AGE_DAYS = int(os.getenv('PROFILE_MAX_AGE_DAYS', 7))
+# Фоновое профилирование: 'маршрут=N,...' - каждый N-й запрос маршрута,
+# например api:recipes-download-shopping-cart=100.
+PROFILE_SAMPLE_EVERY = {
+    route: int(every)
+    for route, _, every in (
+        item.partition('=')
+        for item in os.getenv('PROFILE_SAMPLE_EVERY', '').split(',')
+        if item
+    )
+}
+
+# Сколько секунд снимок пользователя по токену живет в общем кэше (только
+# при SHARED_CACHE) и в памяти воркера. Сброс в памяти других воркеров
+# ждет локального срока.
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', 60))
+TOKEN_CACHE_LOCAL_TIMEOUT = float(os.getenv('TOKEN_CACHE_LOCAL_TIMEOUT', 5))
+
+# Сколько id можно передать в один пакетный запрос избранного, корзины
+# или подписок.
+BATCH_MAX_IDS = int(os.getenv('BATCH_MAX_IDS', 100))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.instrumentation': {
+            'handlers': ['console'],
+            'level': os.getenv('SERVER_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,22 @@
+import os
+import shutil
+
+# Каталог с mmap-файлами метрик воркеров, см. api.metrics. Задается
+# только для gunicorn: manage.py в том же контейнере пишет метрики в
+# память процесса и не зависит от каталога. Переменная должна быть
+# выставлена до импорта prometheus_client, воркеры наследуют ее.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    '/tmp/prometheus',
+)
+
+
+def on_starting(server):
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
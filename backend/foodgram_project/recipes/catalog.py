@@ -0,0 +1,151 @@
+import uuid
+from array import array
+from bisect import bisect_left
+
+from api.metrics import record_cache
+from django.conf import settings
+from django.core.cache import cache
+from recipes.models import Ingredient, Tag, normalize_name
+
+TAG_IDS_CACHE_KEY = 'recipes:tag_ids_by_slug'
+TAG_IDS_CACHE_TIMEOUT = 300
+
+CATALOG_VERSION_CACHE_KEY = 'recipes:catalog_version:{}'
+# Без общего кэша версия видна только своему процессу (импорт через
+# docker compose run, другие воркеры), поэтому живет недолго: после
+# истечения снимки каталога перечитываются из базы.
+CATALOG_VERSION_LOCAL_TIMEOUT = 60
+
+
+def get_tag_ids_by_slug():
+    tag_ids_by_slug = cache.get(TAG_IDS_CACHE_KEY)
+    record_cache('tag_ids', tag_ids_by_slug is not None)
+
+    if tag_ids_by_slug is None:
+        tag_ids_by_slug = dict(Tag.objects.values_list('slug', 'id'))
+        cache.set(
+            TAG_IDS_CACHE_KEY,
+            tag_ids_by_slug,
+            TAG_IDS_CACHE_TIMEOUT,
+        )
+
+    return tag_ids_by_slug
+
+
+def clear_tag_ids_cache():
+    cache.delete(TAG_IDS_CACHE_KEY)
+
+
+def new_catalog_version():
+    # Случайная версия: вытесненный или истекший ключ не совпадет
+    # со старым снимком.
+    return uuid.uuid4().hex
+
+
+def get_catalog_version_timeout():
+    if settings.SHARED_CACHE:
+        return None
+
+    return CATALOG_VERSION_LOCAL_TIMEOUT
+
+
+def get_catalog_version(name):
+    return cache.get_or_set(
+        CATALOG_VERSION_CACHE_KEY.format(name),
+        new_catalog_version,
+        timeout=get_catalog_version_timeout(),
+    )
+
+
+def bump_catalog_version(name):
+    cache.set(
+        CATALOG_VERSION_CACHE_KEY.format(name),
+        new_catalog_version(),
+        timeout=get_catalog_version_timeout(),
+    )
+
+
+def clear_tag_catalog():
+    clear_tag_ids_cache()
+    bump_catalog_version('tags')
+
+
+class IngredientIndex:
+    """Префиксный индекс названий ингредиентов в памяти процесса.
+
+    Хранит отсортированные нормализованные названия и заранее
+    сериализованные ингредиенты. Перестраивается одним запросом,
+    когда меняется версия каталога 'ingredients' (без общего кэша -
+    не реже раза в CATALOG_VERSION_LOCAL_TIMEOUT секунд).
+    """
+
+    def __init__(self):
+        self.snapshot = None
+
+    def load(self, version):
+        ingredients = list(Ingredient.objects.order_by('id').values(
+            'id',
+            'name',
+            'measurement_unit',
+        ))
+        keys = sorted(
+            (normalize_name(ingredient['name']), position)
+            for position, ingredient in enumerate(ingredients)
+        )
+
+        self.snapshot = (
+            version,
+            ingredients,
+            [name for name, _ in keys],
+            array('L', [position for _, position in keys]),
+        )
+
+        return self.snapshot
+
+    def get_snapshot(self):
+        version = get_catalog_version('ingredients')
+        snapshot = self.snapshot
+        hit = snapshot is not None and snapshot[0] == version
+        record_cache('ingredient_index', hit)
+
+        if not hit:
+            snapshot = self.load(version)
+            # Каталог изменился во время загрузки - перечитать позже.
+            if get_catalog_version('ingredients') != version:
+                self.snapshot = None
+
+        return snapshot
+
+    def clear(self):
+        self.snapshot = None
+
+    def search(self, query):
+        _, ingredients, names, positions = self.get_snapshot()
+        query = normalize_name(query)
+
+        if not query:
+            return ingredients
+
+        start = bisect_left(names, query)
+        end = bisect_left(
+            names,
+            query[:-1] + chr(ord(query[-1]) + 1),
+            start,
+        )
+
+        found = list(positions[start:end])
+        found.extend(
+            position
+            for name, position in zip(names, positions)
+            if query in name and not name.startswith(query)
+        )
+
+        return [ingredients[position] for position in found]
+
+
+ingredient_index = IngredientIndex()
+
+
+def clear_ingredient_index():
+    ingredient_index.clear()
+    bump_catalog_version('ingredients')
@@ -0,0 +1,157 @@
+from api.metrics import record_cache
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F, Prefetch
+from recipes.catalog import get_catalog_version
+from recipes.models import Recipe, RecipeIngredient
+from recipes.seriaizers import RecipeSerializer
+
+# Увеличить при изменении полей RecipeSerializer, чтобы не отдавать
+# фрагменты старого формата из общего кэша.
+FRAGMENT_FORMAT = 1
+FRAGMENT_KEY = 'recipe:{}:{}:{}:{}'
+
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def get_fragment_cache():
+    return caches['recipes']
+
+
+def get_fragment_key(recipe_id, revision, tags_version):
+    # Версия рецепта меняется при каждом его изменении (Recipe.save,
+    # recipes.signals), версия каталога тегов - при правке тега.
+    return FRAGMENT_KEY.format(
+        FRAGMENT_FORMAT,
+        tags_version,
+        recipe_id,
+        revision,
+    )
+
+
+def build_fragments(recipe_ids):
+    """Сериализует часть рецептов, не зависящую от пользователя."""
+    recipes = list(Recipe.objects.filter(
+        id__in=recipe_ids,
+    ).select_related(
+        'author',
+    ).defer(
+        'search_vector',
+    ).prefetch_related(
+        'tags',
+        Prefetch(
+            'recipeingredient_set',
+            queryset=RecipeIngredient.objects.select_related(
+                'ingredient',
+            ).order_by('id'),
+        ),
+    ))
+
+    for recipe in recipes:
+        recipe.is_favorited = False
+        recipe.is_in_shopping_cart = False
+        recipe.author_is_subscribed = False
+
+    fragments = {}
+    for recipe, data in zip(recipes, RecipeSerializer(
+        recipes,
+        many=True,
+        context={},
+    ).data):
+        for name in USER_FLAGS:
+            del data[name]
+        del data['author']['is_subscribed']
+        fragments[recipe.id] = (recipe.revision, data)
+
+    return fragments
+
+
+def get_fragments(recipes):
+    """Фрагменты рецептов по id: из общего кэша или собранные заново.
+
+    Без общего кэша фрагменты собираются на каждый запрос: версия
+    каталога тегов в ключе у каждого процесса своя, и правка тега в
+    другом процессе не сбросила бы уже сохраненные фрагменты.
+    """
+    if not settings.SHARED_CACHE:
+        return {
+            recipe_id: data
+            for recipe_id, (_, data) in build_fragments(
+                [recipe.id for recipe in recipes],
+            ).items()
+        }
+
+    tags_version = get_catalog_version('tags')
+    keys = {
+        recipe.id: get_fragment_key(recipe.id, recipe.revision, tags_version)
+        for recipe in recipes
+    }
+    cached = get_fragment_cache().get_many(keys.values())
+
+    fragments = {
+        recipe_id: cached[key]
+        for recipe_id, key in keys.items()
+        if key in cached
+    }
+    missing = [
+        recipe_id for recipe_id in keys if recipe_id not in fragments
+    ]
+
+    record_cache('recipe_fragments', True, len(fragments))
+
+    if missing:
+        record_cache('recipe_fragments', False, len(missing))
+        built = build_fragments(missing)
+        # Ключ - по версии из того же чтения, что и данные: фрагмент,
+        # собранный до изменения, не попадет под новую версию.
+        get_fragment_cache().set_many({
+            get_fragment_key(recipe_id, revision, tags_version): data
+            for recipe_id, (revision, data) in built.items()
+        })
+        fragments.update(
+            (recipe_id, data) for recipe_id, (_, data) in built.items()
+        )
+
+    return fragments
+
+
+def get_recipe_representations(recipes, request):
+    """Данные RecipeSerializer для страницы рецептов.
+
+    recipes - рецепты с полем revision и флагами is_favorited,
+    is_in_shopping_cart и author_is_subscribed. Общая часть берется из
+    кэша фрагментов, флаги пользователя подставляются при ответе.
+    """
+    fragments = get_fragments(recipes)
+    output = []
+
+    for recipe in recipes:
+        fragment = fragments.get(recipe.id)
+        if fragment is None:
+            continue
+
+        data = {
+            name: (
+                getattr(recipe, name) if name in USER_FLAGS
+                else fragment[name]
+            )
+            for name in RecipeSerializer.Meta.fields
+        }
+        data['author'] = {
+            **fragment['author'],
+            'is_subscribed': recipe.author_is_subscribed,
+        }
+        if fragment['image']:
+            data['image'] = request.build_absolute_uri(fragment['image'])
+        output.append(data)
+
+    return output
+
+
+def bump_recipe_revisions(recipes):
+    """Меняет версию рецептов, чьи фрагменты устарели.
+
+    Выполняется в той же транзакции, что и изменение, поэтому фрагмент
+    по новой версии всегда собирается из новых данных.
+    """
+    recipes.update(revision=F('revision') + 1)
@@ -0,0 +1,400 @@
+import csv
+import io
+import random
+import time
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            RecipesAddedToShoppingCart, Tag,
+                            UserFavoriteRecipe)
+from users.models import Subscribe, User
+
+BATCH_SIZE = 50000
+
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+IMAGE_COLORS = (
+    '#E26C2D', '#49B64E', '#8775D2', '#F2C94C', '#56CCF2',
+    '#EB5757', '#6FCF97', '#BB6BD9', '#F2994A', '#2D9CDB',
+)
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Петр', 'Ольга', 'Сергей', 'Елена')
+LAST_NAMES = ('Иванова', 'Петров', 'Смирнова', 'Кузнецов', 'Попова')
+DISHES = ('Салат', 'Суп', 'Рагу', 'Пирог', 'Запеканка', 'Паста', 'Каша')
+TEXT = (
+    'Подготовьте ингредиенты, смешайте их в указанном порядке '
+    'и готовьте до готовности. Подавайте горячим.'
+)
+
+
+class RowWriter:
+    """Пишет строки пачками: COPY на PostgreSQL, bulk_create в других БД."""
+
+    def __init__(self, model, fields, batch_size):
+        self.model = model
+        self.fields = [model._meta.get_field(name) for name in fields]
+        self.batch_size = batch_size
+        self.rows = []
+        self.total = 0
+
+    def add(self, *row):
+        self.rows.append(row)
+
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+
+        if connection.vendor == 'postgresql':
+            self.copy()
+        else:
+            self.model.objects.bulk_create(
+                self.model(**{
+                    field.attname: value
+                    for field, value in zip(self.fields, row)
+                })
+                for row in self.rows
+            )
+
+        self.total += len(self.rows)
+        self.rows = []
+
+    def copy(self):
+        data = io.StringIO()
+        csv.writer(data).writerows(self.rows)
+        data.seek(0)
+
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+                    connection.ops.quote_name(self.model._meta.db_table),
+                    ', '.join(
+                        connection.ops.quote_name(field.column)
+                        for field in self.fields
+                    ),
+                ),
+                data,
+            )
+
+
+class ZipfSampler:
+    """Выбирает элементы с вероятностью 1 / rank ** exponent."""
+
+    def __init__(self, items, exponent, generator):
+        self.items = list(items)
+        generator.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ))
+        self.generator = generator
+
+    def sample(self, count, exclude=None):
+        """Возвращает до count разных элементов, кроме exclude."""
+        count = min(count, len(self.items) - (exclude is not None))
+        chosen = set()
+
+        while len(chosen) < count:
+            chosen.update(self.generator.choices(
+                self.items,
+                cum_weights=self.cum_weights,
+                k=count - len(chosen),
+            ))
+            chosen.discard(exclude)
+
+        return chosen
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, рецептами, '
+        'избранным, корзинами и подписками для нагрузочных тестов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=100000,
+            help='Всего строк избранного',
+        )
+        parser.add_argument(
+            '--carts',
+            type=int,
+            default=20000,
+            help='Всего рецептов в корзинах',
+        )
+        parser.add_argument(
+            '--subscriptions',
+            type=int,
+            default=20000,
+            help='Всего подписок',
+        )
+        parser.add_argument(
+            '--zipf',
+            type=float,
+            default=1.1,
+            help='Показатель распределения популярности рецептов и авторов',
+        )
+        parser.add_argument('--images', type=int, default=10)
+        parser.add_argument('--password', default='foodgram-password')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['recipes'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь и рецепт')
+
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        if not ingredient_ids:
+            raise CommandError(
+                'В базе нет ингредиентов, сначала выполните '
+                'import_ingredients_csv'
+            )
+
+        self.generator = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        with transaction.atomic():
+            tag_ids = self.get_tag_ids()
+            images = self.create_images(options['images'])
+
+            user_ids = self.create_users(
+                options['users'],
+                options['password'],
+            )
+            authors = ZipfSampler(user_ids, options['zipf'], self.generator)
+            recipe_ids = self.create_recipes(
+                options['recipes'],
+                authors,
+                images,
+            )
+            self.create_recipe_links(recipe_ids, tag_ids, ingredient_ids)
+
+            recipes = ZipfSampler(
+                recipe_ids,
+                options['zipf'],
+                self.generator,
+            )
+            self.create_user_links(
+                'Избранное',
+                UserFavoriteRecipe,
+                ('user', 'recipe'),
+                user_ids,
+                recipes,
+                options['favorites'],
+            )
+            self.create_user_links(
+                'Корзины',
+                RecipesAddedToShoppingCart,
+                ('user', 'recipe'),
+                user_ids,
+                recipes,
+                options['carts'],
+            )
+            self.create_user_links(
+                'Подписки',
+                Subscribe,
+                ('user', 'subscribing'),
+                user_ids,
+                authors,
+                options['subscriptions'],
+                exclude_self=True,
+            )
+
+            self.reset_sequences()
+            call_command('rebuild_shopping_lists', stdout=self.stdout)
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        self.stdout.write(self.style.SUCCESS('Данные сгенерированы!'))
+
+    def get_tag_ids(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS
+            )
+
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def create_images(self, count):
+        upload_to = Recipe._meta.get_field('image').upload_to
+        images = []
+
+        for number, color in enumerate(IMAGE_COLORS[:max(count, 1)]):
+            name = f'{upload_to}placeholder_{number}.png'
+
+            if not default_storage.exists(name):
+                content = io.BytesIO()
+                Image.new('RGB', (480, 320), color).save(content, 'PNG')
+                name = default_storage.save(
+                    name,
+                    ContentFile(content.getvalue()),
+                )
+
+            images.append(name)
+
+        return images
+
+    def get_next_id(self, model):
+        return (model.objects.aggregate(last_id=Max('id'))['last_id'] or 0) + 1
+
+    def report(self, label, writer, start):
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{label}: {writer.total} строк за {elapsed:.1f} с, '
+            f'{writer.total / elapsed if elapsed else writer.total:.0f} '
+            f'строк/с'
+        )
+
+    def create_users(self, count, password):
+        start = time.perf_counter()
+        first_id = self.get_next_id(User)
+        password = make_password(password)
+        date_joined = timezone.now()
+
+        writer = RowWriter(
+            User,
+            (
+                'id', 'password', 'is_superuser', 'username', 'first_name',
+                'last_name', 'email', 'is_staff', 'is_active', 'date_joined',
+            ),
+            self.batch_size,
+        )
+
+        for user_id in range(first_id, first_id + count):
+            writer.add(
+                user_id,
+                password,
+                False,
+                f'fake_user_{user_id}',
+                self.generator.choice(FIRST_NAMES),
+                self.generator.choice(LAST_NAMES),
+                f'fake_user_{user_id}@example.com',
+                False,
+                True,
+                date_joined,
+            )
+
+        writer.flush()
+        self.report('Пользователи', writer, start)
+
+        return range(first_id, first_id + count)
+
+    def create_recipes(self, count, authors, images):
+        start = time.perf_counter()
+        first_id = self.get_next_id(Recipe)
+        ingredient_names = list(
+            Ingredient.objects.order_by('id').values_list('name', flat=True)
+        )
+
+        writer = RowWriter(
+            Recipe,
+            (
+                'id', 'author', 'name', 'image', 'text', 'cooking_time',
+                'revision',
+            ),
+            self.batch_size,
+        )
+
+        for recipe_id in range(first_id, first_id + count):
+            writer.add(
+                recipe_id,
+                *authors.sample(1),
+                f'{self.generator.choice(DISHES)}: '
+                f'{self.generator.choice(ingredient_names)}'[:200],
+                self.generator.choice(images),
+                TEXT,
+                self.generator.randint(settings.MIN_TIME, settings.MAX_TIME),
+                0,
+            )
+
+        writer.flush()
+        self.report('Рецепты', writer, start)
+
+        return range(first_id, first_id + count)
+
+    def create_recipe_links(self, recipe_ids, tag_ids, ingredient_ids):
+        start = time.perf_counter()
+
+        tags = RowWriter(
+            Recipe.tags.through,
+            ('recipe', 'tag'),
+            self.batch_size,
+        )
+        ingredients = RowWriter(
+            RecipeIngredient,
+            ('recipe', 'ingredient', 'amount'),
+            self.batch_size,
+        )
+
+        for recipe_id in recipe_ids:
+            for tag_id in self.generator.sample(
+                tag_ids,
+                self.generator.randint(1, min(3, len(tag_ids))),
+            ):
+                tags.add(recipe_id, tag_id)
+
+            for ingredient_id in self.generator.sample(
+                ingredient_ids,
+                self.generator.randint(1, min(10, len(ingredient_ids))),
+            ):
+                ingredients.add(
+                    recipe_id,
+                    ingredient_id,
+                    self.generator.randint(settings.MIN_AMOUNT, 500),
+                )
+
+        tags.flush()
+        ingredients.flush()
+        self.report('Теги рецептов', tags, start)
+        self.report('Ингредиенты рецептов', ingredients, start)
+
+    def create_user_links(self, label, model, fields, user_ids, sampler,
+                          total, exclude_self=False):
+        start = time.perf_counter()
+        writer = RowWriter(model, fields, self.batch_size)
+        per_user, remainder = divmod(total, len(user_ids))
+
+        for position, user_id in enumerate(user_ids):
+            count = per_user + (position < remainder)
+            if not count:
+                continue
+
+            for target_id in sorted(sampler.sample(
+                count,
+                exclude=user_id if exclude_self else None,
+            )):
+                writer.add(user_id, target_id)
+
+        writer.flush()
+        self.report(label, writer, start)
+
+    def reset_sequences(self):
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(),
+                [User, Recipe],
+            ):
+                cursor.execute(sql)
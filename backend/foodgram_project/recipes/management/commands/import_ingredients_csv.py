@@ -1,36 +1,207 @@
 import csv
+import io
+import json
+import os
+import re
+import time
+from itertools import islice
 
 from django.core.management.base import BaseCommand, CommandError
-from recipes.models import Ingredient
+from django.db import connection, transaction
+from recipes.catalog import clear_ingredient_index
+from recipes.models import Ingredient, normalize_name
+
+BATCH_SIZE = 5000
+JSON_CHUNK_SIZE = 64 * 1024
+JSON_SEPARATORS = re.compile(r'[\s,\[\]]*')
+
+STAGING_TABLE = 'ingredient_import'
+
+CREATE_STAGING_SQL = f'''
+    CREATE TEMPORARY TABLE {STAGING_TABLE} (
+        name varchar(200),
+        measurement_unit varchar(200),
+        search_name varchar(200)
+    ) ON COMMIT DROP
+'''
+
+COPY_SQL = f'''
+    COPY {STAGING_TABLE} (name, measurement_unit, search_name)
+    FROM STDIN WITH (FORMAT csv)
+'''
+
+UPSERT_SQL = '''
+    INSERT INTO {table} (name, measurement_unit, search_name)
+    SELECT name, measurement_unit, search_name FROM {staging}
+    ON CONFLICT (name, measurement_unit) DO NOTHING
+'''
+
+
+def read_csv(file):
+    for line, row in enumerate(csv.reader(file), start=1):
+        if not row:
+            continue
+
+        if len(row) < 2:
+            raise CommandError(
+                f'Строка {line}: нужны название и единица измерения'
+            )
+
+        yield row[0], row[1]
+
+
+def read_json(file):
+    """Читает массив объектов или JSON Lines кусками, не загружая файл."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    number = 0
+
+    while True:
+        chunk = file.read(JSON_CHUNK_SIZE)
+        buffer += chunk
+        position = 0
+
+        while True:
+            position = JSON_SEPARATORS.match(buffer, position).end()
+            if position == len(buffer):
+                break
+
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                if not chunk:
+                    raise CommandError(f'Некорректный JSON: {error}')
+                break
+
+            number += 1
+            try:
+                yield item['name'], item['measurement_unit']
+            except (KeyError, TypeError):
+                raise CommandError(
+                    f'Элемент {number}: нужны name и measurement_unit'
+                )
+
+        buffer = buffer[position:]
+
+        if not chunk:
+            return
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
 
 
 class Command(BaseCommand):
-    help = 'Загружает ингредиенты'
+    help = (
+        'Загружает ингредиенты из CSV или JSON. Повторная загрузка '
+        'пропускает уже существующие пары название - единица измерения'
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument('ingredients_csv', type=str,)
+        parser.add_argument('path', type=str)
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла, по умолчанию по расширению',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
 
     def handle(self, *args, **options):
+        path = options['path']
+        self.verbosity = options['verbosity']
+        file_format = options['format'] or (
+            'json' if os.path.splitext(path)[1].lower() == '.json' else 'csv'
+        )
 
-        ingredients_csv = options['ingredients_csv']
+        start = time.perf_counter()
 
         try:
-            with open(ingredients_csv, 'r', encoding='utf-8') as file:
+            with open(path, 'r', encoding='utf-8', newline='') as file:
+                total, inserted = self.import_ingredients(
+                    READERS[file_format](file),
+                    options['batch_size'],
+                )
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать файл: {error}')
+
+        if inserted:
+            clear_ingredient_index()
+
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка завершена! Всего элементов - {total}, '
+            f'добавлено - {inserted}, пропущено - {total - inserted}, '
+            f'{total / elapsed if elapsed else total:.0f} строк/с'
+        ))
+
+    def get_batches(self, rows, batch_size):
+        rows = (
+            (name.strip(), measurement_unit.strip())
+            for name, measurement_unit in rows
+        )
 
-                reader = csv.reader(file)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch
 
-                ingredients = [
+    @transaction.atomic
+    def import_ingredients(self, rows, batch_size):
+        if connection.vendor == 'postgresql':
+            return self.copy_ingredients(rows, batch_size)
+
+        total = 0
+        count_before = Ingredient.objects.count()
+
+        for batch in self.get_batches(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                (
                     Ingredient(
-                        name=row[0],
-                        measurement_unit=row[1]
-                    ) for row in reader
-                ]
+                        name=name,
+                        measurement_unit=measurement_unit,
+                        search_name=normalize_name(name),
+                    )
+                    for name, measurement_unit in batch
+                ),
+                ignore_conflicts=True,
+            )
+            total += len(batch)
+            self.report_progress(total)
+
+        return total, Ingredient.objects.count() - count_before
+
+    def copy_ingredients(self, rows, batch_size):
+        total = 0
+        inserted = 0
+
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_STAGING_SQL)
+
+            for batch in self.get_batches(rows, batch_size):
+                data = io.StringIO()
+                csv.writer(data, quoting=csv.QUOTE_ALL).writerows(
+                    (name, measurement_unit, normalize_name(name))
+                    for name, measurement_unit in batch
+                )
+                data.seek(0)
+
+                cursor.copy_expert(COPY_SQL, data)
+                cursor.execute(UPSERT_SQL.format(
+                    table=Ingredient._meta.db_table,
+                    staging=STAGING_TABLE,
+                ))
+                inserted += cursor.rowcount
+                cursor.execute(f'TRUNCATE {STAGING_TABLE}')
 
-                Ingredient.objects.bulk_create(ingredients)
+                total += len(batch)
+                self.report_progress(total)
 
-            self.stdout.write(self.style.SUCCESS(
-                f'Загрузка завершена! Всего элементов - {len(ingredients)}'
-            ))
+        return total, inserted
 
-        except Ingredient.DoesNotExist:
-            raise CommandError('Ошибка')
+    def report_progress(self, total):
+        if self.verbosity > 1:
+            self.stdout.write(f'Обработано строк - {total}')
@@ -0,0 +1,109 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.models import ShoppingCartIngredient
+from recipes.shopping_list import calculate_shopping_lists
+
+INSERT_SQL = '''
+    INSERT INTO {table} (ingredient_id, user_id, total_amount, recipe_count)
+    {select}
+'''
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает и проверяет списки покупок пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить списки покупок, ничего не изменяя',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='ID пользователя, можно указать несколько раз',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+
+        if options['check']:
+            self.check_shopping_lists(user_ids)
+        else:
+            self.rebuild_shopping_lists(user_ids)
+
+    def get_stored_rows(self, user_ids):
+        queryset = ShoppingCartIngredient.objects.all()
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+
+        return queryset
+
+    def check_shopping_lists(self, user_ids):
+        stored = {
+            (row['user_id'], row['ingredient_id']): (
+                row['total_amount'],
+                row['recipe_count'],
+            )
+            for row in self.get_stored_rows(user_ids).values(
+                'user_id',
+                'ingredient_id',
+                'total_amount',
+                'recipe_count',
+            ).iterator()
+        }
+
+        errors = 0
+
+        for row in calculate_shopping_lists(user_ids).iterator():
+            key = (row['user_id'], row['ingredient_id'])
+            expected = (row['total_amount'], row['recipe_count'])
+            actual = stored.pop(key, None)
+
+            if actual != expected:
+                errors += 1
+                self.stdout.write(
+                    f'Пользователь {key[0]}, ингредиент {key[1]}: '
+                    f'ожидается {expected}, в таблице {actual}'
+                )
+
+        for key, actual in stored.items():
+            errors += 1
+            self.stdout.write(
+                f'Пользователь {key[0]}, ингредиент {key[1]}: '
+                f'лишняя строка {actual}'
+            )
+
+        if errors:
+            raise CommandError(f'Найдено расхождений - {errors}')
+
+        self.stdout.write(self.style.SUCCESS(
+            'Списки покупок совпадают с корзинами'
+        ))
+
+    @transaction.atomic
+    def rebuild_shopping_lists(self, user_ids):
+        self.get_stored_rows(user_ids).delete()
+
+        sql, params = calculate_shopping_lists(user_ids).values_list(
+            'ingredient_id',
+            'user_id',
+            'total_amount',
+            'recipe_count',
+        ).order_by().query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                INSERT_SQL.format(
+                    table=ShoppingCartIngredient._meta.db_table,
+                    select=sql,
+                ),
+                params,
+            )
+            total = cursor.rowcount
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересчитаны! Всего строк - {total}'
+        ))
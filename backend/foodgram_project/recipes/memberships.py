@@ -0,0 +1,192 @@
+from array import array
+from bisect import bisect_left
+
+from api.metrics import record_cache
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import BooleanField, Exists, OuterRef, Value
+from recipes.models import RecipesAddedToShoppingCart, UserFavoriteRecipe
+from users.models import Subscribe
+
+MEMBERSHIP_CACHE_KEY = 'memberships:{}:{}'
+# Ограничивает расхождение с базой после правок мимо API (админка,
+# каскадное удаление, одновременные запросы одного пользователя).
+MEMBERSHIP_CACHE_TIMEOUT = 600
+
+MEMBERSHIPS = {
+    'favorites': (UserFavoriteRecipe, 'recipe_id'),
+    'cart': (RecipesAddedToShoppingCart, 'recipe_id'),
+    'subscriptions': (Subscribe, 'subscribing_id'),
+}
+
+
+def load_membership(user_id, kind):
+    model, field = MEMBERSHIPS[kind]
+
+    return array('q', model.objects.filter(
+        user_id=user_id,
+    ).order_by(field).values_list(field, flat=True))
+
+
+def get_memberships(user_id, *kinds):
+    """Отсортированные массивы id избранного, корзины и подписок.
+
+    Читаются из кэша одним обращением, недостающие загружаются
+    по одному запросу на набор. Без общего кэша - всегда из базы.
+    """
+    if not settings.SHARED_CACHE:
+        return [load_membership(user_id, kind) for kind in kinds]
+
+    keys = {
+        kind: MEMBERSHIP_CACHE_KEY.format(kind, user_id) for kind in kinds
+    }
+    cached = cache.get_many(keys.values())
+    missing = {}
+
+    for kind, key in keys.items():
+        if key not in cached:
+            missing[key] = load_membership(user_id, kind)
+
+    record_cache('memberships', True, len(keys) - len(missing))
+
+    if missing:
+        record_cache('memberships', False, len(missing))
+        cache.set_many(missing, MEMBERSHIP_CACHE_TIMEOUT)
+        cached.update(missing)
+
+    return [cached[keys[kind]] for kind in kinds]
+
+
+def contains(membership, value):
+    position = bisect_left(membership, value)
+    return position < len(membership) and membership[position] == value
+
+
+def update_membership(user_id, kind, values, add):
+    if not settings.SHARED_CACHE:
+        return
+
+    key = MEMBERSHIP_CACHE_KEY.format(kind, user_id)
+
+    def update():
+        membership = cache.get(key)
+        if membership is None:
+            return
+
+        changed = False
+        for value in values:
+            position = bisect_left(membership, value)
+            present = (
+                position < len(membership) and membership[position] == value
+            )
+
+            if add and not present:
+                membership.insert(position, value)
+            elif not add and present:
+                del membership[position]
+            else:
+                continue
+            changed = True
+
+        if changed:
+            cache.set(key, membership, MEMBERSHIP_CACHE_TIMEOUT)
+
+    transaction.on_commit(update)
+
+
+def add_membership(user_id, kind, value):
+    update_membership(user_id, kind, [value], add=True)
+
+
+def remove_membership(user_id, kind, value):
+    update_membership(user_id, kind, [value], add=False)
+
+
+def add_memberships(user_id, kind, values):
+    if values:
+        update_membership(user_id, kind, list(values), add=True)
+
+
+def remove_memberships(user_id, kind, values):
+    if values:
+        update_membership(user_id, kind, list(values), add=False)
+
+
+def annotate_recipe_flags(queryset, user):
+    """Флаги пользователя подзапросами EXISTS, если кэш не общий.
+
+    Наборы в памяти одного воркера расходились бы с базой после
+    изменений в других воркерах.
+    """
+    if settings.SHARED_CACHE:
+        return queryset
+
+    if user.is_anonymous:
+        return queryset.annotate(
+            is_favorited=Value(False, output_field=BooleanField()),
+            is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            author_is_subscribed=Value(False, output_field=BooleanField()),
+        )
+
+    return queryset.annotate(
+        is_favorited=Exists(UserFavoriteRecipe.objects.filter(
+            user=user,
+            recipe=OuterRef('pk'),
+        )),
+        is_in_shopping_cart=Exists(RecipesAddedToShoppingCart.objects.filter(
+            user=user,
+            recipe=OuterRef('pk'),
+        )),
+        author_is_subscribed=Exists(Subscribe.objects.filter(
+            user=user,
+            subscribing=OuterRef('author'),
+        )),
+    )
+
+
+def annotate_is_subscribed(queryset, user):
+    if settings.SHARED_CACHE:
+        return queryset
+
+    if user.is_anonymous:
+        return queryset.annotate(
+            is_subscribed=Value(False, output_field=BooleanField()),
+        )
+
+    return queryset.annotate(
+        is_subscribed=Exists(Subscribe.objects.filter(
+            user=user,
+            subscribing=OuterRef('pk'),
+        )),
+    )
+
+
+def set_recipe_flags(recipes, user):
+    """Проставляет рецептам флаги пользователя без запросов к базе.
+
+    Рецепты с аннотациями annotate_recipe_flags не трогает.
+    """
+    recipes = [
+        recipe for recipe in recipes if not hasattr(recipe, 'is_favorited')
+    ]
+    if not recipes:
+        return
+
+    if user.is_anonymous:
+        favorites = cart = subscriptions = ()
+    else:
+        favorites, cart, subscriptions = get_memberships(
+            user.id,
+            'favorites',
+            'cart',
+            'subscriptions',
+        )
+
+    for recipe in recipes:
+        recipe.is_favorited = contains(favorites, recipe.id)
+        recipe.is_in_shopping_cart = contains(cart, recipe.id)
+        recipe.author_is_subscribed = contains(
+            subscriptions,
+            recipe.author_id,
+        )
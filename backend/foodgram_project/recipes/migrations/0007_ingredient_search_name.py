@@ -0,0 +1,59 @@
+# Generated by Django 3.2.16 on 2026-10-18 15:01
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+from recipes.models import normalize_name
+
+CREATE_SEARCH_NAME_INDEXES_SQL = '''
+    CREATE INDEX recipes_ingredient_search_name_prefix
+        ON recipes_ingredient (search_name text_pattern_ops);
+
+    CREATE INDEX recipes_ingredient_search_name_trgm
+        ON recipes_ingredient USING gin (search_name gin_trgm_ops);
+'''
+
+DROP_SEARCH_NAME_INDEXES_SQL = '''
+    DROP INDEX IF EXISTS recipes_ingredient_search_name_prefix;
+    DROP INDEX IF EXISTS recipes_ingredient_search_name_trgm;
+'''
+
+
+def create_search_name(apps, schema_editor):
+    # Заполняется той же функцией, что и при сохранении ингредиента:
+    # lower()/btrim() в SQL расходятся с casefold()/strip() (ß, пробелы).
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    ingredients = list(Ingredient.objects.only('id', 'name'))
+
+    for ingredient in ingredients:
+        ingredient.search_name = normalize_name(ingredient.name)
+
+    Ingredient.objects.bulk_update(
+        ingredients,
+        ('search_name',),
+        batch_size=1000,
+    )
+
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_SEARCH_NAME_INDEXES_SQL)
+
+
+def drop_search_name(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_NAME_INDEXES_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='ingredient',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=200, verbose_name='Нормализованное название'),
+        ),
+        migrations.RunPython(create_search_name, drop_search_name),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 3.2.16 on 2026-10-18 16:20
+
+from django.db import migrations
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import Coalesce
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes',
+        'ShoppingCartIngredient',
+    )
+
+    duplicates = Ingredient.objects.values(
+        'name',
+        'measurement_unit',
+    ).annotate(
+        keep_id=Min('id'),
+        total=Count('id'),
+    ).filter(total__gt=1).order_by()
+
+    for group in duplicates:
+        keep_id = group['keep_id']
+        duplicate_ids = list(Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit'],
+        ).exclude(id=keep_id).values_list('id', flat=True))
+        user_ids = list(ShoppingCartIngredient.objects.filter(
+            ingredient_id__in=duplicate_ids,
+        ).values_list('user_id', flat=True).distinct())
+
+        RecipeIngredient.objects.filter(
+            ingredient_id__in=duplicate_ids,
+        ).update(ingredient_id=keep_id)
+
+        ShoppingCartIngredient.objects.filter(
+            user_id__in=user_ids,
+            ingredient_id__in=[keep_id, *duplicate_ids],
+        ).delete()
+        ShoppingCartIngredient.objects.bulk_create(
+            ShoppingCartIngredient(ingredient_id=keep_id, **row)
+            for row in RecipeIngredient.objects.filter(
+                ingredient_id=keep_id,
+                recipe__recipe_cart__user_id__in=user_ids,
+            ).values(
+                user_id=F('recipe__recipe_cart__user_id'),
+            ).annotate(
+                # amount допускает NULL, total_amount - нет.
+                total_amount=Sum(Coalesce('amount', 0)),
+                recipe_count=Count('recipe_id', distinct=True),
+            ).order_by()
+        )
+
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+    if schema_editor.connection.vendor == 'postgresql':
+        # Отложенные проверки внешних ключей мешают ALTER TABLE ниже.
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_ingredient_search_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients,
+            migrations.RunPython.noop,
+        ),
+        migrations.AlterUniqueTogether(
+            name='ingredient',
+            unique_together={('name', 'measurement_unit')},
+        ),
+    ]
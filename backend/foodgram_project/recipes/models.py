@@ -1,10 +1,15 @@
 import constants
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core import validators
 from django.db import models
 from users.models import User
 
 
+def normalize_name(name):
+    return name.casefold().replace('ё', 'е').strip()
+
+
 class Ingredient(models.Model):
     name = models.CharField(
         max_length=constants.INGR_NAME,
@@ -18,13 +23,25 @@ class Ingredient(models.Model):
         default='default'
     )
 
+    search_name = models.CharField(
+        max_length=constants.INGR_NAME,
+        verbose_name='Нормализованное название',
+        editable=False,
+        default='',
+    )
+
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        unique_together = ('name', 'measurement_unit')
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
 
 class Tag(models.Model):
     name = models.CharField(
@@ -96,6 +113,16 @@ class Recipe(models.Model):
         verbose_name="Время приготовления в минутах",
         null=False,
     )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name="Поисковый вектор",
+    )
+    revision = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Версия",
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -104,6 +131,21 @@ class Recipe(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Версия входит в ключ фрагмента рецепта (recipes.fragments),
+        # поэтому после сохранения старый фрагмент больше не читается.
+        # F() не теряет увеличение при одновременных сохранениях.
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+
+        self.revision = models.F('revision') + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'revision'}
+        super().save(*args, **kwargs)
+        # Вместо выражения в экземпляре должно остаться число.
+        self.refresh_from_db(fields=['revision'])
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
@@ -187,3 +229,34 @@ class UserFavoriteRecipe(models.Model):
         unique_together = ('user', 'recipe')
         verbose_name = 'Рецепт в избранном'
         verbose_name_plural = 'Рецепты в избранном'
+
+
+class ShoppingCartIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_lists',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.IntegerField(
+        default=0,
+        verbose_name='Общее количество',
+    )
+    recipe_count = models.IntegerField(
+        default=0,
+        verbose_name='Количество рецептов',
+    )
+
+    class Meta:
+        unique_together = ('user', 'ingredient')
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списке покупок'
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient}'
@@ -0,0 +1,35 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+SEARCH_CONFIG = 'russian'
+
+
+def search_recipes(queryset, value):
+    """Полнотекстовый поиск по названию и описанию рецепта.
+
+    На PostgreSQL ищет по search_vector (GIN индекс, триггер
+    из миграции 0006) и сортирует по ts_rank. На других базах,
+    например SQLite в тестах, использует LIKE.
+    """
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            value,
+            config=SEARCH_CONFIG,
+            search_type='websearch',
+        )
+        return queryset.filter(
+            search_vector=query,
+        ).annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+        ).order_by('-search_rank', '-id')
+
+    return queryset.filter(
+        Q(name__icontains=value) | Q(text__icontains=value),
+    ).annotate(
+        search_rank=Case(
+            When(name__icontains=value, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+    ).order_by('-search_rank', '-id')
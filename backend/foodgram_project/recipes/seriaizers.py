@@ -1,14 +1,25 @@
 import base64
+from collections import Counter
 
+from api.instrumentation import TimedSerializerMixin
 from api.serializers import TagSerializer, UsersViewSerializer
 from django.core.files.base import ContentFile
-from django.db.models import F
+from django.db import transaction
+from recipes.memberships import set_recipe_flags
 from recipes.models import (Ingredient, Recipe, RecipeIngredient,
                             RecipesAddedToShoppingCart, Tag,
                             UserFavoriteRecipe)
+from recipes.shopping_list import (apply_shopping_list_changes,
+                                   diff_ingredient_amounts)
 from rest_framework import serializers
 
 
+def get_duplicates(values):
+    return [
+        value for value, count in Counter(values).items() if count > 1
+    ]
+
+
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
@@ -20,7 +31,8 @@ class Base64ImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin,
+                       serializers.ModelSerializer):
     tags = TagSerializer(
         read_only=True,
         many=True,
@@ -75,23 +87,35 @@ class RecipeSerializer(serializers.ModelSerializer):
             )
 
         input_tags = self.initial_data.get('tags')
-        if len(input_tags) == 0:
+        if not input_tags:
             raise serializers.ValidationError(
                 f'{input_tags} Список tags пуст.'
             )
 
-        if len(input_tags) != len(set(input_tags)):
+        if not all(isinstance(tag_id, int) for tag_id in input_tags):
             raise serializers.ValidationError(
-                f'{input_tags} Указаны теги с одинаковыми ID.'
+                f'{input_tags} tag_id должны быть целыми числами.'
             )
 
-        tag_max_id = Tag.objects.latest('id').id
+        errors = []
 
-        for input_tag_id in input_tags:
-            if input_tag_id not in range(0, tag_max_id + 1):
-                raise serializers.ValidationError(
-                    f'{input_tag_id}  Такого tag_id в базе нет  '
-                )
+        duplicate_ids = get_duplicates(input_tags)
+        if duplicate_ids:
+            errors.append(f'{duplicate_ids} Указаны теги с одинаковыми ID.')
+
+        tags = Tag.objects.in_bulk(input_tags)
+
+        unknown_ids = [
+            input_tag_id for input_tag_id in dict.fromkeys(input_tags)
+            if input_tag_id not in tags
+        ]
+        if unknown_ids:
+            errors.append(f'{unknown_ids}  Такого tag_id в базе нет  ')
+
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        return list(tags.values())
 
     def validate_ingredients(self):
         input_ingredients_dataset = self.initial_data.get('ingredients')
@@ -101,122 +125,173 @@ class RecipeSerializer(serializers.ModelSerializer):
                 'Список ингредиентов пустой'
             )
 
-        ingredient_max_id = Ingredient.objects.latest('id').id
+        errors = []
+        ingredient_amounts = {}
+        input_ingredient_ids = []
 
-        for i in range(len(input_ingredients_dataset)):
-            input_ingredient_id = input_ingredients_dataset[i]['id']
+        for input_ingredient in input_ingredients_dataset:
+            input_ingredient_id = input_ingredient.get('id')
+            input_ingredient_amount = input_ingredient.get('amount')
 
-            if input_ingredient_id not in range(0, ingredient_max_id + 1):
-                raise serializers.ValidationError(
-                    f'{input_ingredient_id}  Такого ID в базе нет  '
+            if not isinstance(input_ingredient_id, int):
+                errors.append(
+                    f'{input_ingredient_id}  ingredient_id должен быть '
+                    f'целым числом'
                 )
+                continue
 
-            input_ingredient_amount = input_ingredients_dataset[i]['amount']
+            input_ingredient_ids.append(input_ingredient_id)
 
             if not (isinstance(input_ingredient_amount, int)
-                    or input_ingredient_amount.isdigit()
+                    or str(input_ingredient_amount).isdigit()
                     ):
-
-                raise serializers.ValidationError(
-                    'Кол-во: Неверный тип данных, должно быть целое число'
+                errors.append(
+                    f'{input_ingredient_id}  Кол-во: Неверный тип данных, '
+                    f'должно быть целое число'
                 )
+                continue
 
             if int(input_ingredient_amount) < 1:
-                raise serializers.ValidationError(
-                    'Кол-во не может быть 0.'
+                errors.append(
+                    f'{input_ingredient_id}  Кол-во не может быть 0.'
                 )
+                continue
 
-    def validate(self, attrs):
-        self.validate_tags()
-        self.validate_ingredients()
+            ingredient_amounts[input_ingredient_id] = int(
+                input_ingredient_amount
+            )
 
-        return super().validate(attrs)
+        duplicate_ids = get_duplicates(input_ingredient_ids)
+        if duplicate_ids:
+            errors.append(
+                f'{duplicate_ids}  ingredient_id в запросе дублируется.'
+            )
 
-    def create(self, validated_data):
+        known_ids = set(Ingredient.objects.filter(
+            id__in=input_ingredient_ids,
+        ).values_list('id', flat=True))
 
-        input_tags = self.initial_data.get('tags')
+        unknown_ids = [
+            input_ingredient_id
+            for input_ingredient_id in dict.fromkeys(input_ingredient_ids)
+            if input_ingredient_id not in known_ids
+        ]
+        if unknown_ids:
+            errors.append(f'{unknown_ids}  Такого ID в базе нет  ')
 
-        recipe = Recipe.objects.create(**validated_data)
+        if errors:
+            raise serializers.ValidationError(errors)
 
-        for input_tag_id in input_tags:
+        return ingredient_amounts
 
-            tag, created = Tag.objects.get_or_create(
-                id=input_tag_id
-            )
-            recipe.tags.add(tag)
+    def validate(self, attrs):
+        errors = []
 
-        input_ingredients_dataset = self.initial_data.get('ingredients')
+        for name, validator in (
+            ('tags', self.validate_tags),
+            ('ingredient_amounts', self.validate_ingredients),
+        ):
+            try:
+                attrs[name] = validator()
+            except serializers.ValidationError as error:
+                errors.extend(error.detail)
 
-        for i in range(len(input_ingredients_dataset)):
-            input_ingredient_id = input_ingredients_dataset[i]['id']
-
-            input_ingredient_amount = int(input_ingredients_dataset[i][
-                'amount'
-            ])
-
-            if RecipeIngredient.objects.values(
-                'recipe_id',
-                'ingredient_id'
-            ).filter(
-                recipe_id=recipe.id,
-                ingredient_id=input_ingredient_id
-            ).exists():
-                raise serializers.ValidationError(
-                    f'{input_ingredient_amount}  Ингредиент уже есть!.'
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        return super().validate(attrs)
+
+    def save_ingredients(self, recipe, ingredient_amounts):
+        old_ingredient_amounts = {}
+        changed_ingredients = []
+        removed_ingredient_ids = []
+
+        for recipe_ingredient in RecipeIngredient.objects.filter(
+            recipe=recipe,
+        ).only('id', 'ingredient_id', 'amount'):
+            ingredient_id = recipe_ingredient.ingredient_id
+
+            if (ingredient_id not in ingredient_amounts
+                    or ingredient_id in old_ingredient_amounts):
+                removed_ingredient_ids.append(recipe_ingredient.id)
+                old_ingredient_amounts[ingredient_id] = (
+                    old_ingredient_amounts.get(ingredient_id, 0)
+                    + (recipe_ingredient.amount or 0)
                 )
+                continue
 
-            RecipeIngredient.objects.create(
-                recipe_id=recipe.id,
-                ingredient_id=input_ingredient_id,
-                amount=input_ingredient_amount,
+            old_ingredient_amounts[ingredient_id] = (
+                recipe_ingredient.amount or 0
             )
 
-        return recipe
+            if recipe_ingredient.amount != ingredient_amounts[ingredient_id]:
+                recipe_ingredient.amount = ingredient_amounts[ingredient_id]
+                changed_ingredients.append(recipe_ingredient)
 
-    def update(self, instance, validated_data):
+        if removed_ingredient_ids:
+            RecipeIngredient.objects.filter(
+                id__in=removed_ingredient_ids,
+            ).delete()
 
-        input_ingredients_dataset = self.initial_data.get('ingredients')
+        if changed_ingredients:
+            RecipeIngredient.objects.bulk_update(
+                changed_ingredients,
+                ('amount',),
+            )
 
-        ingredient_max_id = Ingredient.objects.latest('id').id
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for ingredient_id, amount in ingredient_amounts.items()
+            if ingredient_id not in old_ingredient_amounts
+        ])
 
-        input_ingredient_id_checker = 0
+        return old_ingredient_amounts
 
-        RecipeIngredient.objects.filter(
-            recipe=instance
-        ).all().delete()
+    @transaction.atomic
+    def create(self, validated_data):
 
-        for i in range(len(input_ingredients_dataset)):
-            input_ingredient_id = input_ingredients_dataset[i]['id']
+        tags = validated_data.pop('tags')
+        ingredient_amounts = validated_data.pop('ingredient_amounts')
 
-            if input_ingredient_id == input_ingredient_id_checker:
-                raise serializers.ValidationError(
-                    'ingredient_id в запросе дублируется.'
-                )
-            input_ingredient_id_checker = input_ingredient_id
+        recipe = Recipe.objects.create(**validated_data)
 
-            if input_ingredient_id not in range(0, ingredient_max_id + 1):
-                raise serializers.ValidationError(
-                    f'{input_ingredient_id}  Такого ingredient_id в базе нет  '
-                )
+        recipe.tags.set(tags)
 
-            input_ingredient_amount = int(input_ingredients_dataset[i][
-                'amount'
-            ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for ingredient_id, amount in ingredient_amounts.items()
+        ])
 
-            if input_ingredient_amount < 1:
-                raise serializers.ValidationError(
-                    'Кол-во не может быть 0.'
-                )
+        return recipe
 
-            RecipeIngredient.objects.create(
-                recipe_id=instance.id,
-                ingredient_id=input_ingredient_id,
-                amount=input_ingredient_amount,
-            )
+    @transaction.atomic
+    def update(self, instance, validated_data):
 
-        input_tags = self.initial_data.get('tags')
+        tags = validated_data.pop('tags')
+        ingredient_amounts = validated_data.pop('ingredient_amounts')
 
-        instance.tags.set(input_tags)
+        old_ingredient_amounts = self.save_ingredients(
+            instance,
+            ingredient_amounts,
+        )
+
+        apply_shopping_list_changes(
+            instance.id,
+            diff_ingredient_amounts(
+                old_ingredient_amounts,
+                ingredient_amounts,
+            ),
+        )
+
+        instance.tags.set(tags)
 
         instance.image = validated_data.get(
             'image',
@@ -235,41 +310,41 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return instance
 
-    def get_is_favorited(self, obj):
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
 
-        recipe_bollean_value = Recipe.objects.filter(
-            id=obj.id).exists()
+        return super().to_representation(instance)
 
-        favorite_bollean_value = UserFavoriteRecipe.objects.filter(
-            recipe_id=obj.id,
-            user_id=self.context.get('request').user.id
-        ).exists()
+    def get_is_favorited(self, obj):
+        if not hasattr(obj, 'is_favorited'):
+            set_recipe_flags([obj], self.context.get('request').user)
 
-        return recipe_bollean_value and favorite_bollean_value
+        return obj.is_favorited
 
     def get_is_in_shopping_cart(self, obj):
+        if not hasattr(obj, 'is_in_shopping_cart'):
+            set_recipe_flags([obj], self.context.get('request').user)
 
-        recipe_bollean_value = Recipe.objects.filter(
-            id=obj.id).exists()
+        return obj.is_in_shopping_cart
 
-        cart_bollean_value = RecipesAddedToShoppingCart.objects.filter(
-            recipe_id=obj.id,
-            user_id=self.context.get('request').user.id
-        ).exists()
+    def get_ingredients(self, recipe):
+        output = []
 
-        return recipe_bollean_value and cart_bollean_value
+        for recipe_ingredient in recipe.recipeingredient_set.all():
+            ingredient = recipe_ingredient.ingredient
+            output.append({
+                'id': ingredient.id,
+                'name': ingredient.name,
+                'measurement_unit': ingredient.measurement_unit,
+                'amount': recipe_ingredient.amount,
+            })
 
-    def get_ingredients(self, recipe):
-        output = recipe.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F("recipeingredient__amount"),
-        )
         return output
 
 
-class RecipeInShoppingCartSerializer(serializers.ModelSerializer):
+class RecipeInShoppingCartSerializer(TimedSerializerMixin,
+                                     serializers.ModelSerializer):
 
     name = serializers.CharField(
         source='recipe.name'
@@ -291,7 +366,8 @@ class RecipeInShoppingCartSerializer(serializers.ModelSerializer):
         )
 
 
-class UserFavoriteRecipeSerializer(serializers.ModelSerializer):
+class UserFavoriteRecipeSerializer(TimedSerializerMixin,
+                                   serializers.ModelSerializer):
 
     name = serializers.CharField(
         source='recipe.name'
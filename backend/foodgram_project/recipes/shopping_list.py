@@ -0,0 +1,160 @@
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from recipes.models import (RecipeIngredient, RecipesAddedToShoppingCart,
+                            ShoppingCartIngredient)
+
+UPSERT_SQL = '''
+    INSERT INTO {table} (user_id, ingredient_id, total_amount, recipe_count)
+    SELECT users.user_id, changes.ingredient_id,
+           changes.total_amount, changes.recipe_count
+    FROM ({users}) AS users, ({changes}) AS changes
+    WHERE TRUE
+    ON CONFLICT (user_id, ingredient_id) DO UPDATE SET
+        total_amount = {table}.total_amount + EXCLUDED.total_amount,
+        recipe_count = {table}.recipe_count + EXCLUDED.recipe_count
+'''
+
+CART_USERS_SQL = 'SELECT user_id FROM {cart_table} WHERE recipe_id = %s'
+USER_SQL = 'SELECT %s AS user_id'
+
+CHANGE_SQL = (
+    'SELECT %s AS ingredient_id, %s AS total_amount, %s AS recipe_count'
+)
+
+
+def get_ingredient_amounts(recipe_id):
+    amounts = defaultdict(int)
+
+    for ingredient_id, amount in RecipeIngredient.objects.filter(
+        recipe_id=recipe_id,
+    ).values_list('ingredient_id', 'amount'):
+        # amount допускает NULL: такая строка учитывается как 0.
+        amounts[ingredient_id] += amount or 0
+
+    return amounts
+
+
+def diff_ingredient_amounts(old_amounts, new_amounts):
+    changes = {}
+
+    for ingredient_id in old_amounts.keys() | new_amounts.keys():
+        amount = (
+            new_amounts.get(ingredient_id, 0)
+            - old_amounts.get(ingredient_id, 0)
+        )
+        recipe_count = (
+            (ingredient_id in new_amounts)
+            - (ingredient_id in old_amounts)
+        )
+
+        if amount or recipe_count:
+            changes[ingredient_id] = (amount, recipe_count)
+
+    return changes
+
+
+def apply_shopping_list_changes(recipe_id, changes, user_id=None):
+    """Добавляет изменения ингредиентов рецепта в списки покупок.
+
+    changes - словарь {ingredient_id: (amount, recipe_count)}.
+    Изменения применяются ко всем пользователям, у которых рецепт
+    в корзине (вызывать, пока строки корзины существуют), или только
+    к user_id - тогда строка корзины не нужна.
+    """
+    if not changes:
+        return
+
+    if user_id is None:
+        users = CART_USERS_SQL.format(
+            cart_table=RecipesAddedToShoppingCart._meta.db_table,
+        )
+        params = [recipe_id]
+    else:
+        users = USER_SQL
+        params = [user_id]
+
+    for ingredient_id, (amount, recipe_count) in changes.items():
+        params.extend((ingredient_id, amount, recipe_count))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            UPSERT_SQL.format(
+                table=ShoppingCartIngredient._meta.db_table,
+                users=users,
+                changes=' UNION ALL '.join([CHANGE_SQL] * len(changes)),
+            ),
+            params,
+        )
+
+    empty_rows = ShoppingCartIngredient.objects.filter(
+        ingredient_id__in=changes,
+        recipe_count__lte=0,
+    )
+    if user_id is not None:
+        empty_rows = empty_rows.filter(user_id=user_id)
+    empty_rows.delete()
+
+
+def add_recipe_to_shopping_list(recipe_id, user_id):
+    apply_shopping_list_changes(
+        recipe_id,
+        diff_ingredient_amounts({}, get_ingredient_amounts(recipe_id)),
+        user_id=user_id,
+    )
+
+
+def remove_recipe_from_shopping_list(recipe_id, user_id=None):
+    apply_shopping_list_changes(
+        recipe_id,
+        diff_ingredient_amounts(get_ingredient_amounts(recipe_id), {}),
+        user_id=user_id,
+    )
+
+
+def get_recipes_changes(recipe_ids, sign):
+    return {
+        row['ingredient_id']: (
+            sign * row['total_amount'],
+            sign * row['recipe_count'],
+        )
+        for row in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids,
+        ).values('ingredient_id').annotate(
+            total_amount=Sum(Coalesce('amount', 0)),
+            recipe_count=Count('recipe_id', distinct=True),
+        ).order_by()
+    }
+
+
+def add_recipes_to_shopping_list(recipe_ids, user_id):
+    apply_shopping_list_changes(
+        None,
+        get_recipes_changes(recipe_ids, 1),
+        user_id=user_id,
+    )
+
+
+def remove_recipes_from_shopping_list(recipe_ids, user_id):
+    apply_shopping_list_changes(
+        None,
+        get_recipes_changes(recipe_ids, -1),
+        user_id=user_id,
+    )
+
+
+def calculate_shopping_lists(user_ids=None):
+    """Считает списки покупок заново по RecipesAddedToShoppingCart."""
+    cart_filter = {'recipe__recipe_cart__isnull': False}
+    if user_ids is not None:
+        cart_filter = {'recipe__recipe_cart__user_id__in': user_ids}
+
+    return RecipeIngredient.objects.filter(**cart_filter).values(
+        'ingredient_id',
+        user_id=F('recipe__recipe_cart__user_id'),
+    ).annotate(
+        total_amount=Sum(Coalesce('amount', 0)),
+        recipe_count=Count('recipe_id', distinct=True),
+    ).order_by('user_id', 'ingredient_id')
@@ -0,0 +1,66 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from recipes.catalog import clear_ingredient_index, clear_tag_catalog
+from recipes.fragments import bump_recipe_revisions
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+# Поля пользователя, которые входят во фрагмент рецепта как автор.
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    transaction.on_commit(clear_tag_catalog)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    transaction.on_commit(clear_ingredient_index)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    bump_recipe_revisions(Recipe.objects.filter(
+        recipeingredient__ingredient=instance,
+    ))
+
+
+# Сохранение рецепта само меняет его версию (Recipe.save). Без
+# post_delete: удаление строк идет вместе с сохранением или удалением
+# рецепта, а обработчик отключил бы быстрое удаление.
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    bump_recipe_revisions(Recipe.objects.filter(id=instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if action == 'pre_clear' and reverse:
+        recipes = Recipe.objects.filter(tags=instance)
+    elif action in ('post_add', 'post_remove') and reverse:
+        recipes = Recipe.objects.filter(id__in=pk_set)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        recipes = Recipe.objects.filter(id=instance.id)
+    else:
+        return
+
+    bump_recipe_revisions(recipes)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    if created or (
+        update_fields is not None
+        and not AUTHOR_FIELDS.intersection(update_fields)
+    ):
+        return
+
+    bump_recipe_revisions(Recipe.objects.filter(author=instance))
@@ -0,0 +1,164 @@
+from django.db import connection
+from recipes.models import Recipe
+
+# Рецепт проверяется в том же запросе, что и вставка: строки нет -
+# рецепта нет, id вставки NULL - запись уже была.
+ADD_SQL = '''
+    WITH recipe AS (
+        SELECT id, name, image, cooking_time
+        FROM {recipe_table}
+        WHERE id = %s
+    ), inserted AS (
+        INSERT INTO {table} (user_id, recipe_id)
+        SELECT %s, id FROM recipe
+        ON CONFLICT (user_id, recipe_id) DO NOTHING
+        RETURNING id
+    )
+    SELECT inserted.id, recipe.id, recipe.name, recipe.image,
+           recipe.cooking_time
+    FROM recipe LEFT JOIN inserted ON TRUE
+'''
+
+# Добавленные и удаленные строки берутся из RETURNING самой вставки
+# или удаления, а не из чтения до нее: параллельный запрос мог успеть
+# между ними. Несуществующие id пропускаются тем же запросом.
+ADD_MANY_SQL = '''
+    INSERT INTO {table} (user_id, {column})
+    SELECT %s, id FROM {target_table} WHERE id IN ({ids})
+    ON CONFLICT (user_id, {column}) DO NOTHING
+    RETURNING {column}
+'''
+
+REMOVE_MANY_SQL = '''
+    DELETE FROM {table}
+    WHERE user_id = %s AND {column} IN ({ids})
+    RETURNING {column}
+'''
+
+
+def add_recipe_to_user_list(model, user_id, recipe_id):
+    """Добавляет рецепт в избранное или корзину одним запросом.
+
+    Возвращает (None, False), если рецепта нет, и (запись, created).
+    """
+    if connection.vendor != 'postgresql':
+        recipe = Recipe.objects.filter(id=recipe_id).only(
+            'id', 'name', 'image', 'cooking_time',
+        ).first()
+        if recipe is None:
+            return None, False
+
+        return model.objects.get_or_create(user_id=user_id, recipe=recipe)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            ADD_SQL.format(
+                recipe_table=Recipe._meta.db_table,
+                table=model._meta.db_table,
+            ),
+            [recipe_id, user_id],
+        )
+        row = cursor.fetchone()
+
+    if row is None:
+        return None, False
+
+    entry_id, recipe_id, name, image, cooking_time = row
+    recipe = Recipe(
+        id=recipe_id,
+        name=name,
+        image=image,
+        cooking_time=cooking_time,
+    )
+
+    return model(id=entry_id, user_id=user_id, recipe=recipe), (
+        entry_id is not None
+    )
+
+
+def remove_recipe_from_user_list(model, user_id, recipe_id):
+    """Удаляет рецепт из избранного или корзины одним DELETE.
+
+    Возвращает число удаленных строк.
+    """
+    deleted, _ = model.objects.filter(
+        user_id=user_id,
+        recipe_id=recipe_id,
+    ).delete()
+
+    return deleted
+
+
+def get_existing_ids(model, field, ids):
+    """Какие из ids есть в таблице, на которую ссылается model.field."""
+    target = model._meta.get_field(field).related_model
+
+    return set(target.objects.filter(id__in=ids).values_list(
+        'id',
+        flat=True,
+    ))
+
+
+def can_return_rows():
+    """Поддерживает ли база INSERT/DELETE ... RETURNING с ON CONFLICT."""
+    if connection.vendor == 'postgresql':
+        return True
+
+    return (
+        connection.vendor == 'sqlite'
+        and connection.Database.sqlite_version_info >= (3, 35)
+    )
+
+
+def execute_many(sql, model, field, user_id, ids):
+    target_field = model._meta.get_field(field)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql.format(
+                table=model._meta.db_table,
+                column=target_field.column,
+                target_table=target_field.related_model._meta.db_table,
+                ids=', '.join(['%s'] * len(ids)),
+            ),
+            [user_id, *ids],
+        )
+        return {target_id for target_id, in cursor.fetchall()}
+
+
+def add_many_to_user_list(model, field, user_id, ids):
+    """Добавляет пакетом записи user_id -> ids, возвращает id добавленных.
+
+    field - поле model со ссылкой на рецепт или автора. Добавленными
+    считаются только строки, которые вставил этот запрос.
+    """
+    if not ids:
+        return set()
+
+    if can_return_rows():
+        return execute_many(ADD_MANY_SQL, model, field, user_id, ids)
+
+    existing = get_existing_ids(model, field, ids)
+    return {
+        target_id for target_id in ids
+        if target_id in existing and model.objects.get_or_create(
+            user_id=user_id,
+            **{f'{field}_id': target_id},
+        )[1]
+    }
+
+
+def remove_many_from_user_list(model, field, user_id, ids):
+    """Удаляет записи user_id -> ids, возвращает id удаленных."""
+    if not ids:
+        return set()
+
+    if can_return_rows():
+        return execute_many(REMOVE_MANY_SQL, model, field, user_id, ids)
+
+    return {
+        target_id for target_id in ids
+        if model.objects.filter(
+            user_id=user_id,
+            **{f'{field}_id': target_id},
+        ).delete()[0]
+    }